@@ -0,0 +1,64 @@
+"""
+Token authentication with cached token lookups.
+
+``TokenAuthentication`` joins the token and user tables on every
+authenticated request. ``CachedTokenAuthentication`` keeps successful
+lookups for ``TOKEN_CACHE_TIMEOUT`` seconds in the ``TOKEN_CACHE_ALIAS``
+cache, which every worker process shares. Entries are dropped when the
+token is deleted (logout) and whenever its user is saved (deactivation,
+password change...), so no process keeps serving them. Without an alias
+every request reads the database.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+
+    @property
+    def cache(self):
+        if settings.TOKEN_CACHE_ALIAS is None:
+            return None
+        return caches[settings.TOKEN_CACHE_ALIAS]
+
+    @staticmethod
+    def get_cache_key(key):
+        return f'auth-token:{key}'
+
+    def get(self, key):
+        if self.cache is None:
+            return None
+        return self.cache.get(self.get_cache_key(key))
+
+    def set(self, key, credentials):
+        if self.cache is not None:
+            self.cache.set(
+                self.get_cache_key(key), credentials,
+                settings.TOKEN_CACHE_TIMEOUT
+            )
+
+    def delete(self, key):
+        if self.cache is not None:
+            self.cache.delete(self.get_cache_key(key))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+
+        user, token = credentials
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return credentials
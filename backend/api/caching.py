@@ -0,0 +1,230 @@
+"""
+HTTP caching of read endpoints.
+
+``ConditionalGetMixin`` emits ``ETag`` validators computed from the
+generation counters of the data a response is built from, and answers
+``If-None-Match`` with 304 before the serializers run.
+
+``AnonymousResponseCacheMixin`` stores responses to unauthenticated
+``GET`` requests, which carry no per-user state, in the
+``RESPONSE_CACHE_ALIAS`` cache keyed by the path, the normalized query
+string, the ``Accept`` header and the same generations. Bumping a
+generation, in any process, makes every dependent entry unreachable; the
+cache backend evicts it later. Hits and misses are counted in the same
+cache, for ``manage.py response_cache_stats``.
+"""
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from recipes.generations import get_generations, get_user_generation
+
+USER_FLAGS_PARAM = 'user_flags'
+HIT = 'hits'
+MISS = 'misses'
+CACHED_HEADERS = ('Content-Type', 'Vary', 'Allow', 'ETag', 'Last-Modified')
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_metric_key(basename, metric):
+    return f'response-cache:{metric}:{basename}'
+
+
+def record_metric(basename, metric):
+    cache = get_response_cache()
+    key = get_metric_key(basename, metric)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_metrics(basename):
+    cache = get_response_cache()
+    values = cache.get_many([
+        get_metric_key(basename, metric) for metric in (HIT, MISS)
+    ])
+    return tuple(
+        values.get(get_metric_key(basename, metric), 0)
+        for metric in (HIT, MISS)
+    )
+
+
+def reset_metrics(basename):
+    get_response_cache().delete_many([
+        get_metric_key(basename, metric) for metric in (HIT, MISS)
+    ])
+
+
+def omits_user_flags(query_params):
+    """Whether the client asked for the payload without per-user flags."""
+    return query_params.get(USER_FLAGS_PARAM, '').lower() in ('0', 'false')
+
+
+def get_normalized_query(request):
+    return repr(sorted(
+        (param, sorted(values)) for param, values in request.GET.lists()
+    ))
+
+
+def get_request_generations(request, names):
+    """
+    The ``names`` generations, each read at most once per request: the
+    cache key, the ETag and the ingredient index share the values.
+    """
+    request = getattr(request, '_request', request)
+    if not hasattr(request, 'generations'):
+        request.generations = {}
+    missing = [name for name in names if name not in request.generations]
+    if missing:
+        request.generations.update(get_generations(missing))
+    return {name: request.generations[name] for name in names}
+
+
+def get_response_cache_key(request, generations):
+    key = '|'.join((
+        request.path,
+        get_normalized_query(request),
+        request.META.get('HTTP_ACCEPT', ''),
+        repr(sorted(get_request_generations(request, generations).items())),
+    ))
+    return f'response:{md5(key.encode()).hexdigest()}'
+
+
+class ConditionalGetMixin:
+    """
+    Conditional ``GET`` for the ``list`` and ``retrieve`` actions.
+
+    The ETag covers the path, the query string, the
+    ``get_cache_generations()`` counters, the counter of the requesting
+    user and ``get_object_version()``, so it is known without serializing
+    the response. ``get_last_modified()`` may add a ``Last-Modified`` date.
+    """
+    cache_generations = ()
+
+    def get_cache_generations(self):
+        return self.cache_generations
+
+    def is_public_request(self, request):
+        """Whether the response is the same for every user."""
+        return False
+
+    def get_object_version(self):
+        return ''
+
+    def get_last_modified(self):
+        return None
+
+    def get_etag(self):
+        request = self.request
+        generations = list(self.get_cache_generations())
+        if (
+            request.user.is_authenticated
+            and not self.is_public_request(request)
+        ):
+            generations.append(get_user_generation(request.user.pk))
+        key = '|'.join((
+            request.path,
+            get_normalized_query(request),
+            request.accepted_media_type or '',
+            repr(sorted(
+                get_request_generations(request, generations).items()
+            )),
+            str(self.get_object_version()),
+        ))
+        return quote_etag(md5(key.encode()).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag()
+        last_modified = self.get_last_modified()
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Serves anonymous ``GET`` requests of a viewset from the response cache.
+
+    ``cache_generations`` lists the generation counters the responses
+    depend on. Requests carrying credentials bypass the cache before
+    authentication runs, unless ``is_public_request()`` tells that their
+    response is the same for every user, so only shared payloads are
+    stored.
+    """
+    cache_generations = ()
+
+    def is_public_request(self, request):
+        return False
+
+    def is_cacheable(self, request):
+        if not (
+            settings.RESPONSE_CACHE_ENABLED
+            and request.method == 'GET'
+            and self.action_map.get('get') in ('list', 'retrieve')
+        ):
+            return False
+        return (
+            'HTTP_AUTHORIZATION' not in request.META
+            or self.is_public_request(request)
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        cache_key = get_response_cache_key(request, self.cache_generations)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record_metric(self.basename, HIT)
+            content, headers = cached
+            response = get_conditional_response(
+                request, etag=headers.get('ETag')
+            ) or HttpResponse(content)
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        record_metric(self.basename, MISS)
+        response = super().dispatch(request, *args, **kwargs)
+        # Only JSON is shared: the browsable API embeds a CSRF token.
+        if (
+            response.status_code == 200
+            and getattr(response, 'accepted_renderer', None) is not None
+            and response.accepted_renderer.format == 'json'
+        ):
+            response.render()
+            cache.set(cache_key, (response.content, {
+                header: response[header]
+                for header in CACHED_HEADERS if response.has_header(header)
+            }))
+        return response
@@ -1,16 +1,196 @@
-import base64
+import binascii
+from io import SEEK_END, BytesIO
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile, TemporaryUploadedFile
+)
+from PIL import Image
 from rest_framework import serializers
-from django.core.files.base import ContentFile
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+# Characters of base64 decoded per step; a multiple of 4.
+BASE64_CHUNK_SIZE = 64 * 1024
+# format: (extension, signature test on the first decoded bytes)
+IMAGE_SIGNATURES = {
+    'PNG': ('png', lambda head: head.startswith(b'\x89PNG\r\n\x1a\n')),
+    'JPEG': ('jpg', lambda head: head.startswith(b'\xff\xd8\xff')),
+    'GIF': ('gif', lambda head: head[:6] in (b'GIF87a', b'GIF89a')),
+    'WEBP': ('webp', lambda head: (
+        head.startswith(b'RIFF') and head[8:12] == b'WEBP'
+    )),
+}
+
+
+def get_image_format(head):
+    for image_format, (_, matches) in IMAGE_SIGNATURES.items():
+        if matches(head):
+            return image_format
+    return None
+
+
+def get_image_size(file):
+    """Dimensions from the image header, or ``None`` if it is incomplete."""
+    position = file.tell()
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            return image.size
+    except Exception:
+        return None
+    finally:
+        file.seek(position)
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Image field that also accepts ``data:image/...;base64,`` URIs.
+
+    The payload is decoded chunk by chunk into an upload file, spilled to
+    a temporary file like multipart uploads above
+    ``FILE_UPLOAD_MAX_MEMORY_SIZE``. The announced size is checked before
+    decoding, the format signature and the header dimensions as soon as
+    the first chunk is decoded, so oversized or foreign payloads are
+    rejected before the rest is written.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Invalid base64 image data.',
+        'max_upload_size': (
+            'Ensure the image is at most {max_size} bytes.'
+        ),
+        'unsupported_format': (
+            'Unsupported image format. Use one of: {formats}.'
+        ),
+        'max_pixels': 'Ensure the image has at most {max_pixels} pixels.',
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
+            data = self.decode(data)
+        return super().to_internal_value(data)
+
+    def check_size(self, size):
+        if size is not None and (
+            size[0] * size[1] > settings.IMAGE_UPLOAD_MAX_PIXELS
+        ):
+            self.fail(
+                'max_pixels', max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS
+            )
+
+    def decode(self, data):
+        offset = data.find(';base64,')
+        if offset < 0:
+            self.fail('invalid_base64')
+        offset += len(';base64,')
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        estimated_size = (len(data) - offset) * 3 // 4
+        if estimated_size > max_size:
+            self.fail('max_upload_size', max_size=max_size)
+
+        if estimated_size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile('temp', None, 0, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, 'temp', None, 0, None
+            )
+        try:
+            image_format = self.write_chunks(file, data, offset)
+        except Exception:
+            file.close()
+            raise
+
+        extension = IMAGE_SIGNATURES[image_format][0]
+        file.name = f'temp.{extension}'
+        file.content_type = Image.MIME[image_format]
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def write_chunks(self, file, data, offset):
+        image_format = None
+        remainder = ''
+        for start in range(offset, len(data), BASE64_CHUNK_SIZE):
+            chunk = remainder + ''.join(
+                data[start:start + BASE64_CHUNK_SIZE].split()
+            )
+            end = len(chunk) - len(chunk) % 4
+            remainder = chunk[end:]
+            try:
+                file.write(binascii.a2b_base64(chunk[:end]))
+            except binascii.Error:
+                self.fail('invalid_base64')
 
-            data = ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
+            if image_format is None:
+                file.seek(0)
+                image_format = get_image_format(file.read(16))
+                if image_format is None:
+                    self.fail(
+                        'unsupported_format',
+                        formats=', '.join(IMAGE_SIGNATURES)
+                    )
+                file.seek(0, SEEK_END)
+                # Headers usually fit into the first chunk; otherwise the
+                # dimensions are checked once everything is decoded.
+                size = get_image_size(file)
+                self.check_size(size)
+        if remainder or image_format is None:
+            self.fail('invalid_base64')
+        if size is None:
+            self.check_size(get_image_size(file))
+        return image_format
 
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that resolves a whole batch of values in one query.
+
+    ``prefetch()`` loads every referenced object with a single ``IN``
+    lookup; later calls to ``to_internal_value()`` are served from it and
+    fail with the same messages as ``PrimaryKeyRelatedField``.
+    """
+    prefetched = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            raise TypeError
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def prefetch(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, DjangoValidationError,
+                    serializers.ValidationError):
+                continue
+        self.prefetched = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.prefetched is None:
+            return super().to_internal_value(data)
+
+        try:
+            return self.prefetched[self.to_pk(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, (list, tuple)):
+            self.child_relation.prefetch(data)
         return super().to_internal_value(data)
@@ -1,17 +1,24 @@
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import (
-    BooleanFilter, FilterSet, ModelMultipleChoiceFilter
+    BooleanFilter, CharFilter, FilterSet, ModelMultipleChoiceFilter
 )
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe, Tag, Ingredient
+from api.caching import get_request_generations
+from recipes import full_text, tag_masks
+from recipes.generations import INGREDIENTS
+from recipes.models import Recipe, Tag, Ingredient, get_search_key
+from recipes.search import ingredient_index
 
 
 class RecipeFilter(FilterSet):
 
     tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
+        field_name='tags',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags'
     )
     is_favorited = BooleanFilter(
         method='filter_is_favorited'
@@ -19,10 +26,32 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search'
+        )
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+
+        tag_ids = [tag.pk for tag in value]
+        mask = tag_masks.get_tags_mask(tag_ids)
+        if mask is not None:
+            return queryset.alias(
+                tag_match=F('tags_mask').bitand(mask)
+            ).filter(tag_match__gt=0)
+
+        # A semi-join on the through table: recipes with several of the
+        # selected tags are returned once, without a DISTINCT.
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=tag_ids
+            )
+        ))
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -36,10 +65,47 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shoppingcart__user=user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return full_text.search(queryset, value)
+
 
 class IngredientFilter(SearchFilter):
+    """
+    Ingredients whose name starts with ``?name=``, followed by those that
+    contain it, compared by the normalized ``search_key``. Lists are served
+    from the in-process prefix index unless ``INGREDIENT_SEARCH_INDEX`` is
+    off.
+    """
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name:
+            return queryset
+
+        if settings.INGREDIENT_SEARCH_INDEX and view.action == 'list':
+            generations = get_request_generations(request, (INGREDIENTS,))
+            return ingredient_index.search(name, generations[INGREDIENTS])
+
+        search_key = get_search_key(name)
+        if view.action != 'list':
+            return queryset.filter(search_key__contains=search_key)
+
+        # Two index scans instead of a sequential one: LIKE 'x%' is served
+        # by the varchar_pattern_ops index, LIKE '%x%' by the trigram one.
+        ordering = ('search_key', 'measurement_unit')
+        prefix_matches = queryset.filter(search_key__startswith=search_key)
+        substring_matches = queryset.filter(
+            search_key__contains=search_key
+        ).exclude(search_key__startswith=search_key)
+        return [
+            *prefix_matches.order_by(*ordering),
+            *substring_matches.order_by(*ordering),
+        ]
+
     class Meta:
         model = Ingredient
         fields = ('name',)
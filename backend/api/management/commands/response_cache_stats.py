@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from api.caching import (
+    AnonymousResponseCacheMixin, get_metrics, get_response_cache,
+    reset_metrics
+)
+from api.urls import router_v1
+
+
+class Command(BaseCommand):
+    """
+    Report the hit rate of the anonymous response cache.
+
+    Hits and misses are counted per endpoint in the response cache itself,
+    so the numbers cover every worker process. This needs a shared backend
+    such as Redis or Memcached: a process-local one is refused, since this
+    command would only see its own, empty, counters.
+
+    python manage.py response_cache_stats
+    python manage.py response_cache_stats --reset
+    """
+    help = 'Report hits and misses of the anonymous response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after reporting them.'
+        )
+
+    def handle(self, *args, **options):
+        if isinstance(get_response_cache(), (LocMemCache, DummyCache)):
+            raise CommandError(
+                f'The "{settings.RESPONSE_CACHE_ALIAS}" cache is local to '
+                f'each process; set RESPONSE_CACHE_BACKEND to a shared '
+                f'backend to collect hit rates.'
+            )
+        for prefix, viewset, basename in router_v1.registry:
+            if not issubclass(viewset, AnonymousResponseCacheMixin):
+                continue
+            hits, misses = get_metrics(basename)
+            total = hits + misses
+            hit_rate = hits / total * 100 if total else 0
+            self.stdout.write(
+                f'{basename}: {hits} hits, {misses} misses, '
+                f'{hit_rate:.1f}% hit rate'
+            )
+            if options['reset']:
+                reset_metrics(basename)
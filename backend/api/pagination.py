@@ -1,9 +1,239 @@
+from hashlib import md5
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (
+    Cursor, CursorPagination, PageNumberPagination
+)
+
+from api.caching import get_request_generations
+from recipes.generations import get_user_generation
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATED = 'estimated'
+COUNT_CACHED = 'cached'
+
+
+def estimate_count(model, using='default'):
+    """Row count of the model's table from the planner statistics."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+class CountingPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, count_function=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_function = count_function
+
+    @cached_property
+    def count(self):
+        if self.count_function is None:
+            return super().count
+        return self.count_function(self.object_list)
 
 
 class ApiPageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination with a per-endpoint counting strategy.
+
+    ``count_mode`` is one of:
+
+    * ``exact`` - a plain ``COUNT(*)`` on every request;
+    * ``cached`` - the exact count, cached for a short time per path,
+      user, filter parameters and data generations;
+    * ``estimated`` - the planner's row estimate for unfiltered listings
+      of large tables, the cached exact count otherwise.
+    """
     page_size_query_param = 'limit'
     max_page_size = settings.MAX_PAGE_SIZE
     page_size = settings.PAGE_SIZE
     default_page_size = settings.DEFAULT_PAGE_SIZE
+    count_mode = COUNT_EXACT
+    count_cache_timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+    estimated_count_threshold = settings.PAGINATION_ESTIMATED_COUNT_THRESHOLD
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count_generations(self):
+        """The generations of the view's data and of the requesting user."""
+        get_cache_generations = getattr(
+            self.view, 'get_cache_generations', tuple
+        )
+        generations = list(get_cache_generations())
+        if self.request.user.is_authenticated:
+            generations.append(get_user_generation(self.request.user.pk))
+        return get_request_generations(self.request, generations)
+
+    def django_paginator_class(self, object_list, per_page):
+        return CountingPaginator(
+            object_list, per_page, count_function=self.count_queryset
+        )
+
+    def count_queryset(self, queryset):
+        if self.count_mode == COUNT_EXACT:
+            return queryset.count()
+
+        if self.count_mode == COUNT_ESTIMATED and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate >= self.estimated_count_threshold:
+                return estimate
+
+        return self.get_cached_count(queryset)
+
+    def get_count_cache_key(self):
+        query_params = self.request.query_params.copy()
+        for param in (self.page_query_param, self.page_size_query_param):
+            query_params.pop(param, None)
+
+        key = '|'.join((
+            self.request.path,
+            str(self.request.user.pk),
+            query_params.urlencode(),
+            repr(sorted(self.get_count_generations().items())),
+        ))
+        return f'pagination-count:{md5(key.encode()).hexdigest()}'
+
+    def get_cached_count(self, queryset):
+        cache_key = self.get_count_cache_key()
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.count_cache_timeout)
+        return count
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over ``(pub_date, id)``, newest recipes first.
+
+    The cursor stores the position of the last row served, so every page
+    is fetched with an index seek instead of ``COUNT(*)`` and ``OFFSET``.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+    page_size = settings.PAGE_SIZE
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by('-pub_date', '-id')
+
+        if self.cursor is not None and self.cursor.position is not None:
+            pub_date, pk = self.parse_position(self.cursor.position)
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'pub_date__{lookup}': pub_date})
+                | Q(pub_date=pub_date, **{f'id__{lookup}': pk})
+            )
+            has_preceding_page = True
+        else:
+            has_preceding_page = False
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_page = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = has_preceding_page
+            self.has_previous = has_following_page
+        else:
+            self.has_next = has_following_page
+            self.has_previous = has_preceding_page
+
+        return self.page
+
+    def parse_position(self, position):
+        try:
+            pub_date, pk = position.split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def _get_position_from_instance(self, instance, ordering=None):
+        return f'{instance.pub_date.isoformat()}|{instance.pk}'
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        position = self._get_position_from_instance(self.page[-1])
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+
+        position = self._get_position_from_instance(self.page[0])
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position)
+        )
+
+
+class RecipePagination(ApiPageNumberPagination):
+    """
+    Page-number pagination that switches to keyset mode on ``?cursor=``.
+
+    Requests with the usual ``page``/``limit`` parameters keep the
+    ``count``/``next``/``previous``/``results`` response; an empty
+    ``cursor`` parameter starts the feed from the newest recipe. Keyset
+    pages always follow ``(pub_date, id)``, so querysets with an order of
+    their own, such as ``?search=`` results ranked by relevance, are
+    rejected in keyset mode rather than silently reordered.
+    """
+    cursor_pagination_class = RecipeCursorPagination
+    cursor_paginator = None
+    count_mode = COUNT_ESTIMATED
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        if queryset.query.order_by:
+            raise ValidationError({cursor_query_param: (
+                'Cursor pagination is not available for ordered results '
+                'such as a search; use page numbers.'
+            )})
+        self.cursor_paginator = self.cursor_pagination_class()
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class SubscriptionPagination(ApiPageNumberPagination):
+    count_mode = COUNT_CACHED
@@ -0,0 +1,79 @@
+import csv
+import json
+from io import StringIO
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+STREAM_CHUNK_ROWS = 500
+
+
+class ShoppingCartRendererMixin:
+    """
+    Streams aggregated shopping cart rows as a downloadable file.
+
+    ``stream()`` consumes rows with ``ingredient__name``,
+    ``ingredient__measurement_unit`` and ``amount`` keys lazily and yields
+    the file in chunks of ``STREAM_CHUNK_ROWS`` rows.
+    """
+    header = ''
+    footer = ''
+
+    def render_row(self, row, index):
+        raise NotImplementedError
+
+    def stream(self, rows):
+        buffer = [self.header]
+        for index, row in enumerate(rows):
+            buffer.append(self.render_row(row, index))
+            if len(buffer) >= STREAM_CHUNK_ROWS:
+                yield ''.join(buffer)
+                buffer = []
+        buffer.append(self.footer)
+        yield ''.join(buffer)
+
+
+class ShoppingCartTextRenderer(ShoppingCartRendererMixin, BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False)
+
+    def render_row(self, row, index):
+        return (
+            f'{row["ingredient__name"]} '
+            f'({row["ingredient__measurement_unit"]}) — {row["amount"]}\n'
+        )
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRendererMixin, BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    header = 'name,measurement_unit,amount\r\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False)
+
+    def render_row(self, row, index):
+        line = StringIO()
+        csv.writer(line).writerow((
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['amount'],
+        ))
+        return line.getvalue()
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRendererMixin, JSONRenderer):
+    header = '['
+    footer = ']'
+
+    def render_row(self, row, index):
+        item = json.dumps({
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount'],
+        }, ensure_ascii=False)
+        return f',{item}' if index else item
@@ -1,18 +1,43 @@
+from collections import defaultdict
+from collections.abc import Mapping
+
 from django.db import transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 from rest_framework.validators import UniqueTogetherValidator
 
-from api.fields import Base64ImageField
+from api.caching import omits_user_flags
+from api.fields import Base64ImageField, BulkPrimaryKeyRelatedField
+from recipes import full_text, images, shopping_lists
 from recipes.models import (
     Tag, Ingredient, Recipe, FavoriteRecipe, ShoppingCart, IngredientRecipe
 )
 from users.models import FoodgramUser, Subscription
 
 
-class FoodgramUserSerializer(UserSerializer):
+class UserFlagsMixin:
+    """
+    Drops ``user_flag_fields`` when the request asks for
+    ``?user_flags=false``: the payload is then the same for every user and
+    clients take the flags from the state overlay.
+    """
+    user_flag_fields = ()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None and omits_user_flags(request.query_params):
+            for field_name in self.user_flag_fields:
+                fields.pop(field_name, None)
+        return fields
+
+
+class FoodgramUserSerializer(UserFlagsMixin, UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
+    user_flag_fields = ('is_subscribed',)
 
     class Meta:
         model = FoodgramUser
@@ -20,6 +45,9 @@ class FoodgramUserSerializer(UserSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         request = self.context.get('request')
         return (
             request
@@ -29,25 +57,77 @@ class FoodgramUserSerializer(UserSerializer):
         )
 
 
+# Columns of the recipe previews in subscriptions.
+RECIPE_PREVIEW_FIELDS = (
+    'id', 'name', 'image', 'image_variants', 'cooking_time'
+)
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+
+    @staticmethod
+    def get_recipe_previews(authors, recipes_limit):
+        recipes = (
+            Recipe.objects
+            .filter(author__in=authors)
+            .only(*RECIPE_PREVIEW_FIELDS, 'author_id')
+        )
+        if recipes_limit is None:
+            return recipes
+
+        ranked = recipes.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            'WHERE row_number <= %s ORDER BY author_id, row_number',
+            (*params, recipes_limit)
+        )
+
+    def to_representation(self, data):
+        authors = list(data)
+        request = self.context.get('request')
+        previews = defaultdict(list)
+        for recipe in self.get_recipe_previews(
+            authors, get_recipes_limit(request)
+        ):
+            previews[recipe.author_id].append(recipe)
+
+        for author in authors:
+            author.recipe_previews = previews[author.pk]
+        return super().to_representation(authors)
+
+
 class SubscriptionSerializer(FoodgramUserSerializer):
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(FoodgramUserSerializer.Meta):
         model = FoodgramUser
         fields = FoodgramUserSerializer.Meta.fields + ('recipes',
                                                        'recipes_count',)
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        list_serializer_class = SubscriptionListSerializer
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
+        if hasattr(obj, 'recipe_previews'):
+            recipes = obj.recipe_previews
+        else:
+            request = self.context.get('request')
+            recipes_limit = get_recipes_limit(request)
+            recipes = obj.recipes.only(*RECIPE_PREVIEW_FIELDS)
 
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
 
         serializer = RecipeSummarySerializer(recipes, many=True)
         return serializer.data
@@ -100,44 +180,70 @@ class IngredientRecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class IngredientRecipeListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields['id'].prefetch(
+                item.get('id') for item in data if isinstance(item, Mapping)
+            )
+        return super().to_internal_value(data)
+
+
 class IngredientRecipeWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = IngredientRecipe
         fields = ('id', 'amount')
+        list_serializer_class = IngredientRecipeListSerializer
 
 
-class RecipeSummarySerializer(serializers.ModelSerializer):
+class RecipeImageMixin(serializers.Serializer):
+    """
+    ``image`` is the ``image_size`` JPEG variant and ``image_variants``
+    maps every size and format to its URL; both serve the original until
+    the variants are rendered.
+    """
+    image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    image_size = 'full'
+
+    def get_image(self, obj):
+        return images.get_image_url(obj, self.image_size)
+
+    def get_image_variants(self, obj):
+        return images.get_variant_urls(obj)
+
+
+class RecipeSummarySerializer(RecipeImageMixin, serializers.ModelSerializer):
+    image_size = 'card'
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(UserFlagsMixin, RecipeImageMixin,
+                           serializers.ModelSerializer):
     author = FoodgramUserSerializer()
     tags = TagSerializer(many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     ingredients = IngredientRecipeReadSerializer(many=True,
                                                  source='ingredientrecipe')
-    image = serializers.SerializerMethodField(
-        'get_image',
-        read_only=True,
-    )
+    user_flag_fields = ('is_favorited', 'is_in_shopping_cart')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',
                   'text', 'author', 'tags', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart')
 
-    def get_image(self, obj):
-        if obj.image:
-            return obj.image.url
-        return None
-
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         request = self.context.get('request')
         return (
             request
@@ -146,6 +252,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         request = self.context.get('request')
         return (
             request
@@ -156,8 +265,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
     image = Base64ImageField(use_url=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     ingredients = IngredientRecipeWriteSerializer(many=True,
                                                   source='ingredientrecipe')
 
@@ -208,6 +316,45 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             ingredient_recipes.append(ingredient_recipe)
         IngredientRecipe.objects.bulk_create(ingredient_recipes)
 
+    def update_ingredients(self, recipe, ingredients_data):
+        current = {
+            ingredient_recipe.ingredient_id: ingredient_recipe
+            for ingredient_recipe in recipe.ingredientrecipe.all()
+        }
+        to_create = []
+        to_update = []
+        deltas = {
+            ingredient_id: -ingredient_recipe.amount
+            for ingredient_id, ingredient_recipe in current.items()
+        }
+        for ingredient_data in ingredients_data:
+            ingredient = ingredient_data.get('id')
+            amount = ingredient_data.get('amount')
+
+            ingredient_recipe = current.pop(ingredient.id, None)
+            if ingredient_recipe is None:
+                to_create.append(IngredientRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=amount
+                ))
+                deltas[ingredient.id] = amount
+            elif ingredient_recipe.amount != amount:
+                deltas[ingredient.id] = amount - ingredient_recipe.amount
+                ingredient_recipe.amount = amount
+                to_update.append(ingredient_recipe)
+            else:
+                del deltas[ingredient.id]
+
+        if current:
+            IngredientRecipe.objects.filter(
+                pk__in=[ingredient_recipe.pk
+                        for ingredient_recipe in current.values()]
+            ).delete()
+        IngredientRecipe.objects.bulk_update(to_update, ('amount',))
+        IngredientRecipe.objects.bulk_create(to_create)
+        shopping_lists.apply_ingredient_changes(recipe.pk, deltas)
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredientrecipe')
@@ -217,20 +364,30 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         self.process_ingredients(recipe, ingredients_data)
         recipe.tags.set(tags)
+        full_text.update_search_vectors((recipe.pk,))
         return recipe
 
     @transaction.atomic
     def update(self, recipe, validated_data):
         ingredients_data = validated_data.pop('ingredientrecipe')
         tags = validated_data.pop('tags')
-        recipe.ingredients.clear()
 
-        self.process_ingredients(recipe, ingredients_data)
+        self.update_ingredients(recipe, ingredients_data)
         recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+        recipe = super().update(recipe, validated_data)
+        full_text.update_search_vectors((recipe.pk,))
+        return recipe
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'ingredientrecipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
         serializer = RecipeReadSerializer(instance,
                                           context={'request': request})
         return serializer.data
@@ -0,0 +1,481 @@
+import base64
+import json
+import shutil
+import tempfile
+from io import BytesIO
+from threading import Event, Thread
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.http import StreamingHttpResponse
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from api.authentication import CachedTokenAuthentication, TokenCache
+from api.renderers import STREAM_CHUNK_ROWS
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+)
+from recipes.search import ingredient_index
+from recipes.tag_masks import MAX_TAG_ID, get_tags_mask
+from recipes.user_state import get_state
+from users.models import FoodgramUser, Subscription
+
+
+def create_user(number):
+    return FoodgramUser.objects.create_user(
+        username=f'user{number}',
+        email=f'user{number}@example.com',
+        first_name='First',
+        last_name='Last',
+        password='password'
+    )
+
+
+def create_recipe(author, ingredients):
+    """A recipe with ``(ingredient, amount)`` pairs."""
+    recipe = Recipe.objects.create(
+        author=author, name=f'Recipe {Recipe.objects.count()}', text='Text',
+        cooking_time=10, image='recipes/images/recipe.jpg'
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    return recipe
+
+
+def get_image_data():
+    content = BytesIO()
+    Image.new('RGB', (8, 8), (200, 30, 30)).save(content, 'PNG')
+    encoded = base64.b64encode(content.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ListQueryCountTests(APITestCase):
+    """The number of queries of a list does not grow with the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(50)]
+        cls.reader = cls.users[0]
+        tag = Tag.objects.create(name='Lunch', color='#00FF00', slug='lunch')
+        ingredient = Ingredient.objects.create(
+            name='beet', measurement_unit='g'
+        )
+        for number, author in enumerate(cls.users):
+            if number % 2:
+                Subscription.objects.create(
+                    subscriber=cls.reader, subscribed_to=author
+                )
+            recipe = Recipe.objects.create(
+                author=author, name=f'Recipe {number}', text='Text',
+                cooking_time=10, image='recipes/images/recipe.jpg'
+            )
+            recipe.tags.add(tag)
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def assertFlatQueryCount(self, url):
+        # Both requests count the rows: the count is cached per filter.
+        cache.clear()
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url, {'limit': 5})
+        self.assertEqual(len(response.data['results']), 5)
+
+        cache.clear()
+        with self.assertNumQueries(len(small_page)):
+            response = self.client.get(url, {'limit': 50})
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_users(self):
+        self.assertFlatQueryCount('/api/users/')
+
+    def test_recipes(self):
+        self.assertFlatQueryCount('/api/recipes/')
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class RecipeWriteQueryCountTests(APITestCase):
+    """Writing a recipe costs the same queries for 5 or 40 ingredients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Tag {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ingredient {number}', measurement_unit='g'
+            )
+            for number in range(80)
+        ]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.client.force_authenticate(self.author)
+
+    def get_data(self, ingredients, amount=10):
+        return {
+            'name': 'Borscht',
+            'text': 'Text',
+            'cooking_time': 90,
+            'image': get_image_data(),
+            'tags': [tag.pk for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient in ingredients
+            ],
+        }
+
+    def assertFlatQueryCount(self, method, few, many):
+        """Run the ``(url, data)`` requests ``few`` and ``many``."""
+        with CaptureQueriesContext(connection) as few_queries:
+            response = method(*few, format='json')
+        self.assertLess(response.status_code, 300, response.data)
+
+        with self.assertNumQueries(len(few_queries)):
+            response = method(*many, format='json')
+        self.assertLess(response.status_code, 300, response.data)
+        return response
+
+    def test_create(self):
+        response = self.assertFlatQueryCount(
+            self.client.post,
+            ('/api/recipes/', self.get_data(self.ingredients[:5])),
+            ('/api/recipes/', self.get_data(self.ingredients[40:])),
+        )
+        self.assertEqual(len(response.data['ingredients']), 40)
+
+    def test_update(self):
+        few = Recipe.objects.create(
+            author=self.author, name='Few', text='Text', cooking_time=10,
+            image='recipes/images/recipe.jpg'
+        )
+        many = Recipe.objects.create(
+            author=self.author, name='Many', text='Text', cooking_time=10,
+            image='recipes/images/recipe.jpg'
+        )
+        # Every update keeps, changes, adds and removes ingredients.
+        for recipe, ingredients in (
+            (few, self.ingredients[:10]), (many, self.ingredients[:60])
+        ):
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe=recipe, ingredient=ingredient,
+                                 amount=number % 2 + 10)
+                for number, ingredient in enumerate(ingredients)
+            )
+
+        response = self.assertFlatQueryCount(
+            self.client.patch,
+            (f'/api/recipes/{few.pk}/', self.get_data(self.ingredients[5:15])),
+            (f'/api/recipes/{many.pk}/',
+             self.get_data(self.ingredients[40:80])),
+        )
+        self.assertEqual(len(response.data['ingredients']), 40)
+
+
+class ShoppingCartDownloadTests(APITestCase):
+    """The shopping list is streamed with compatible units merged."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        sugar_grams, sugar_kilograms, eggs = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (
+                ('сахар', 'г'), ('сахар', 'кг'), ('яйца', 'шт.')
+            )
+        )
+        for ingredients in (
+            ((sugar_grams, 200), (eggs, 2)),
+            ((sugar_kilograms, 1), (eggs, 3)),
+        ):
+            recipe = create_recipe(cls.user, ingredients)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return response
+
+    def get_content(self, file_format):
+        response = self.download(file_format)
+        return b''.join(response.streaming_content).decode()
+
+    def test_txt(self):
+        self.assertEqual(
+            self.get_content('txt'),
+            'сахар (г) — 1200\nяйца (шт.) — 5\n'
+        )
+
+    def test_csv(self):
+        self.assertEqual(
+            self.get_content('csv'),
+            'name,measurement_unit,amount\r\n'
+            'сахар,г,1200\r\nяйца,шт.,5\r\n'
+        )
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.get_content('json')), [
+            {'name': 'сахар', 'measurement_unit': 'г', 'amount': 1200},
+            {'name': 'яйца', 'measurement_unit': 'шт.', 'amount': 5},
+        ])
+
+    def test_large_cart_is_streamed_in_chunks(self):
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient {number:05}', measurement_unit='г')
+            for number in range(STREAM_CHUNK_ROWS * 3)
+        )
+        recipe = create_recipe(
+            self.user, [(ingredient, 1) for ingredient in ingredients]
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+        chunks = list(self.download('txt').streaming_content)
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(
+            sum(chunk.count(b'\n') for chunk in chunks),
+            STREAM_CHUNK_ROWS * 3 + 2
+        )
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class RecipeTagFilterTests(APITestCase):
+    """Recipes with several of the selected tags are listed once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(0)
+        cls.breakfast, cls.lunch = (
+            Tag.objects.create(name=name, color=color, slug=name.lower())
+            for name, color in (('Breakfast', '#FF0000'), ('Lunch', '#00FF00'))
+        )
+        # Has no bit in the tags mask: filters on it take the EXISTS path.
+        cls.dinner = Tag.objects.create(
+            pk=MAX_TAG_ID + 1, name='Dinner', color='#0000FF', slug='dinner'
+        )
+        # Three recipes of every tag combination below: lunch and dinner
+        # recipes also carry one or both of the other tags.
+        for number in range(9):
+            recipe = create_recipe(author, ())
+            recipe.tags.set(
+                (cls.breakfast, cls.lunch, cls.dinner)[number % 3:]
+            )
+
+    def get_pages(self, slugs, limit=2):
+        cache.clear()
+        recipe_ids = []
+        page = 1
+        while True:
+            response = self.client.get('/api/recipes/', {
+                'tags': slugs, 'limit': limit, 'page': page
+            })
+            self.assertEqual(response.status_code, 200)
+            recipe_ids += [recipe['id'] for recipe in response.data['results']]
+            if response.data['next'] is None:
+                return response.data['count'], recipe_ids
+            page += 1
+
+    def assertListedOnce(self, tags):
+        slugs = [tag.slug for tag in tags]
+        expected = set().union(*(
+            Recipe.objects.filter(tags__slug=slug).values_list('pk', flat=True)
+            for slug in slugs
+        ))
+        count, recipe_ids = self.get_pages(slugs)
+        self.assertEqual(count, len(expected))
+        self.assertEqual(len(recipe_ids), len(set(recipe_ids)))
+        self.assertEqual(set(recipe_ids), expected)
+
+    def test_tags_mask(self):
+        tags = (self.breakfast, self.lunch)
+        self.assertIsNotNone(get_tags_mask(tag.pk for tag in tags))
+        self.assertListedOnce(tags)
+
+    def test_tag_without_mask_bit(self):
+        for tags in (
+            (self.lunch, self.dinner),
+            (self.breakfast, self.lunch, self.dinner),
+        ):
+            self.assertIsNone(get_tags_mask(tag.pk for tag in tags))
+            self.assertListedOnce(tags)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class CachedCountTests(APITestCase):
+    """A cached page count does not outlive a write to the listed data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        cls.lunch = Tag.objects.create(
+            name='Lunch', color='#00FF00', slug='lunch'
+        )
+        for number in range(14):
+            create_recipe(cls.author, ()).tags.add(cls.lunch)
+
+    def get_page(self, page):
+        return self.client.get(
+            '/api/recipes/', {'tags': 'lunch', 'limit': 7, 'page': page}
+        )
+
+    def test_new_recipe(self):
+        cache.clear()
+        self.assertEqual(self.get_page(2).data['count'], 14)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, ()).tags.add(self.lunch)
+
+        response = self.get_page(2)
+        self.assertEqual(response.data['count'], 15)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(self.get_page(3).data['results']), 1)
+
+
+@override_settings(
+    RESPONSE_CACHE_ENABLED=True, INGREDIENT_SEARCH_INDEX=True,
+    INGREDIENT_SEARCH_INDEX_CHECK_INTERVAL=60
+)
+class IngredientSearchQueryCountTests(APITestCase):
+    """An autocomplete keystroke reads the generation counters once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('сахар', 'сахарная пудра', 'соль', 'тростниковый сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        caches[settings.RESPONSE_CACHE_ALIAS].clear()
+        ingredient_index.version = None
+        # Builds the index.
+        self.client.get('/api/ingredients/', {'name': 'соль'})
+
+    def test_miss(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['сахар', 'сахарная пудра', 'тростниковый сахар']
+        )
+
+    def test_hit(self):
+        first = self.client.get('/api/ingredients/', {'name': 'сах'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(response.content, first.content)
+
+
+class UserStateVersionTests(TransactionTestCase):
+    """A delta never skips a change that commits after a later one."""
+
+    def setUp(self):
+        self.user = create_user(0)
+        self.first, self.second = (
+            create_recipe(self.user, ()) for _ in range(2)
+        )
+
+    def run_in_thread(self, function):
+        def target():
+            try:
+                function()
+            finally:
+                connection.close()
+
+        thread = Thread(target=target)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        return thread
+
+    def get_favorites(self, since):
+        state = get_state(self.user, since)
+        return state['version'], set(state['favorites']['added'])
+
+    def test_interleaved_writers(self):
+        version, favorites = self.get_favorites(None)
+        self.assertEqual(favorites, set())
+        recorded = Event()
+        commit = Event()
+
+        def add_first():
+            with transaction.atomic():
+                FavoriteRecipe.objects.create(
+                    user=self.user, recipe=self.first
+                )
+                recorded.set()
+                commit.wait(5)
+
+        self.run_in_thread(add_first)
+        self.assertTrue(recorded.wait(5))
+        # Starts after the first writer and waits for it to commit.
+        second_writer = self.run_in_thread(
+            lambda: FavoriteRecipe.objects.create(
+                user=self.user, recipe=self.second
+            )
+        )
+        second_writer.join(0.5)
+        version, seen = self.get_favorites(version)
+
+        commit.set()
+        second_writer.join(5)
+        version, favorites = self.get_favorites(version)
+        self.assertEqual(seen | favorites, {self.first.pk, self.second.pk})
+
+
+@override_settings(TOKEN_CACHE_ALIAS='default')
+class TokenCacheTests(APITestCase):
+    """Logouts and deactivations reach the token cache of every worker."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(0)
+        self.token = Token.objects.create(user=self.user)
+        # The token cache of another worker process.
+        self.other_worker = TokenCache()
+        user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    def authenticate(self):
+        with mock.patch('api.authentication.token_cache', self.other_worker):
+            return CachedTokenAuthentication().authenticate_credentials(
+                self.token.key
+            )
+
+    def test_logout(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
@@ -1,6 +1,9 @@
-from django.http.response import HttpResponse
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import (
+    BooleanField, Exists, F, OuterRef, Prefetch, Value
+)
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -10,24 +13,56 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api.caching import (
+    AnonymousResponseCacheMixin, ConditionalGetMixin, omits_user_flags
+)
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import ApiPageNumberPagination
+from api.pagination import (
+    ApiPageNumberPagination, RecipePagination, SubscriptionPagination
+)
 from api.permissions import IsAuthorOrAdminOrReadOnly
+from api.renderers import (
+    ShoppingCartCSVRenderer, ShoppingCartJSONRenderer, ShoppingCartTextRenderer
+)
 from api.serializers import (
     FavoriteSerializer, FoodgramUserSerializer, IngredientSerializer,
     RecipeReadSerializer, RecipeWriteSerializer, ShoppingCartSerializer,
     SubscriptionSerializer, TagSerializer, SubscribeUnsubscribeSerializer
 )
+from recipes.generations import INGREDIENTS, RECIPES, TAGS, USERS
 from recipes.models import (
-    Recipe, Tag, Ingredient, FavoriteRecipe, ShoppingCart, IngredientRecipe
+    Recipe, Tag, Ingredient, FavoriteRecipe, ShoppingCart, IngredientRecipe,
+    ShoppingListItem
 )
+from recipes.units import merge_compatible_units
+from recipes.user_state import get_state
 from users.models import FoodgramUser, Subscription
 
+SHOPPING_CART_CHUNK_SIZE = 2000
+
 
-class FoodgramUserViewSet(UserViewSet):
+def annotate_is_subscribed(queryset, user):
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_subscribed=Exists(Subscription.objects.filter(
+            subscriber=user, subscribed_to=OuterRef('pk')
+        ))
+    )
+
+
+class FoodgramUserViewSet(ConditionalGetMixin, UserViewSet):
     queryset = FoodgramUser.objects.all()
     serializer_class = FoodgramUserSerializer
     pagination_class = ApiPageNumberPagination
+    cache_generations = (USERS,)
+
+    def get_queryset(self):
+        return annotate_is_subscribed(
+            super().get_queryset(), self.request.user
+        )
 
     def get_permissions(self):
         if self.action == 'me':
@@ -35,6 +70,23 @@ class FoodgramUserViewSet(UserViewSet):
 
         return super().get_permissions()
 
+    def get_cache_generations(self):
+        if self.action == 'subscriptions':
+            return (USERS, RECIPES)
+        return super().get_cache_generations()
+
+    @action(detail=False, url_path='me/state',
+            permission_classes=(IsAuthenticated,))
+    def state(self, request):
+        since = request.query_params.get('since')
+        if since is not None:
+            if not since.isdigit():
+                raise ValidationError(
+                    {'since': 'Version must be a non-negative integer.'}
+                )
+            since = int(since)
+        return Response(get_state(request.user, since))
+
     @action(detail=True, methods=('post',),
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id):
@@ -69,11 +121,16 @@ class FoodgramUserViewSet(UserViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
         raise ValidationError({'error': 'Subscription does not exist'})
 
-    @action(detail=False, permission_classes=(IsAuthenticated,))
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            pagination_class=SubscriptionPagination)
     def subscriptions(self, request):
+        return self.conditional_response(self.list_subscriptions, request)
+
+    def list_subscriptions(self, request):
         current_user = request.user
         subscriptions = FoodgramUser.objects.filter(
-            subscribers__subscriber=current_user)
+            subscribers__subscriber=current_user
+        ).annotate(is_subscribed=Value(True, output_field=BooleanField()))
         page = self.paginate_queryset(subscriptions)
         serializer = SubscriptionSerializer(page,
                                             many=True,
@@ -81,61 +138,133 @@ class FoodgramUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(AnonymousResponseCacheMixin, ConditionalGetMixin,
+                 ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_generations = (TAGS,)
 
+    def is_public_request(self, request):
+        return True
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+
+class IngredientViewSet(AnonymousResponseCacheMixin, ConditionalGetMixin,
+                        ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
+    cache_generations = (INGREDIENTS,)
+
+    def is_public_request(self, request):
+        return True
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, ConditionalGetMixin,
+                    ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = ApiPageNumberPagination
+    cache_generations = (RECIPES, TAGS, INGREDIENTS)
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     serializer_class = RecipeWriteSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
-    def get_serializer_class(self):
-        if self.request.method in ('POST', 'PATCH'):
-            return super().get_serializer_class()
-        return RecipeReadSerializer
-
-    @staticmethod
-    def generate_shopping_cart_content(shopping_cart_content):
-        response = HttpResponse(content_type='text/plain')
+    def is_public_request(self, request):
+        return omits_user_flags(request.GET) and not any(
+            param in request.GET
+            for param in ('is_favorited', 'is_in_shopping_cart')
+        )
 
-        for item in shopping_cart_content:
-            ingredient_name = item['ingredient__name']
-            measurement_unit = item['ingredient__measurement_unit']
-            amount = item['amount']
+    def get_queryset(self):
+        user = self.request.user
+        if omits_user_flags(self.request.query_params):
+            user = AnonymousUser()
+        # The search vector is only needed in WHERE, never in the payload.
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            Prefetch(
+                'author',
+                queryset=annotate_is_subscribed(
+                    FoodgramUser.objects.all(), user
+                )
+            ),
+            'tags',
+            Prefetch(
+                'ingredientrecipe',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+        )
 
-            response.write(
-                f'{ingredient_name} ({measurement_unit}) — {amount}\n'
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
             )
-
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.txt"'
+        return queryset.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
         )
-        return response
+
+    def get_cache_generations(self):
+        # A single recipe depends on its own row, tracked by updated_at,
+        # and on the names of its tags, ingredients and author.
+        if self.action == 'retrieve':
+            return (TAGS, INGREDIENTS, USERS)
+        return super().get_cache_generations()
+
+    def get_updated_at(self):
+        if not hasattr(self, '_updated_at'):
+            try:
+                self._updated_at = Recipe.objects.filter(
+                    pk=self.kwargs[self.lookup_field]
+                ).values_list('updated_at', flat=True).first()
+            except (TypeError, ValueError):
+                self._updated_at = None
+        return self._updated_at
+
+    def get_object_version(self):
+        if self.action != 'retrieve':
+            return ''
+        return self.get_updated_at()
+
+    def get_last_modified(self):
+        # The flags of an authenticated user change without updated_at.
+        if self.action != 'retrieve' or self.request.user.is_authenticated:
+            return None
+        return self.get_updated_at()
+
+    def get_serializer_class(self):
+        if self.request.method in ('POST', 'PATCH'):
+            return super().get_serializer_class()
+        return RecipeReadSerializer
 
     @action(detail=False, methods=('get',),
-            permission_classes=(IsAuthenticated,))
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(ShoppingCartTextRenderer,
+                              ShoppingCartCSVRenderer,
+                              ShoppingCartJSONRenderer))
     def download_shopping_cart(self, request):
         shopping_cart_content = (
-            IngredientRecipe.objects
-            .filter(recipe__shoppingcart__user=request.user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
-            .order_by('ingredient__name')
+            ShoppingListItem.objects
+            .filter(user=request.user)
+            .values('ingredient__name', 'ingredient__measurement_unit',
+                    amount=F('total_amount'))
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
+            .iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
         )
+        renderer = request.accepted_renderer
 
-        return self.generate_shopping_cart_content(shopping_cart_content)
+        response = StreamingHttpResponse(
+            renderer.stream(merge_compatible_units(shopping_cart_content)),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
+        return response
 
     def base_create_action(self, request, pk, serializer_class):
         data = {
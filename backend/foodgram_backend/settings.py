@@ -20,13 +20,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
     'users',
     'api',
-    'recipes'
+    'recipes',
+    'tasks'
 ]
 
 MIDDLEWARE = [
@@ -106,13 +108,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.FoodgramUser'
 
+RESPONSE_CACHE_ALIAS = 'responses'
+
+CACHES = {
+    # Holds short-lived pagination counts.
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # Also counts hits and misses; response_cache_stats needs a shared
+    # backend to read them.
+    RESPONSE_CACHE_ALIAS: {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -132,3 +159,45 @@ DJOSER = {
 MAX_PAGE_SIZE = 100
 PAGE_SIZE = 6
 DEFAULT_PAGE_SIZE = 6
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_ESTIMATED_COUNT_THRESHOLD = 10000
+
+INGREDIENT_SEARCH_INDEX = (
+    os.getenv('INGREDIENT_SEARCH_INDEX', 'true').strip().lower() == 'true'
+)
+# Seconds between checks of the ingredient table for changes made by
+# other processes.
+INGREDIENT_SEARCH_INDEX_CHECK_INTERVAL = int(
+    os.getenv('INGREDIENT_SEARCH_INDEX_CHECK_INTERVAL', 5)
+)
+
+RESPONSE_CACHE_ENABLED = (
+    os.getenv('RESPONSE_CACHE_ENABLED', 'true').strip().lower() == 'true'
+)
+
+# Token lookups are cached only in a cache shared by every worker, such as
+# Redis or Memcached: a logout must reach all of them.
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 60))
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS') or None
+
+# Limits of uploaded recipe images: decoded bytes and pixels.
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv('IMAGE_UPLOAD_MAX_PIXELS', 40000000))
+
+# Seconds during which an unreferenced image blob is kept after it was
+# last written, so an upload of the same content can still refer to it.
+IMAGE_COLLECTION_GRACE = int(os.getenv('IMAGE_COLLECTION_GRACE', 60))
+
+# Run background tasks in the process on commit instead of queueing them
+# for `manage.py run_worker`, e.g. in development without a worker.
+TASK_QUEUE_EAGER = (
+    os.getenv('TASK_QUEUE_EAGER', 'false').strip().lower() == 'true'
+)
+TASK_WORKER_CONCURRENCY = int(os.getenv('TASK_WORKER_CONCURRENCY', 2))
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', 1))
+TASK_LEASE = int(os.getenv('TASK_LEASE', 300))
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', 5))
+TASK_RETRY_BACKOFF = int(os.getenv('TASK_RETRY_BACKOFF', 10))
+TASK_RETRY_BACKOFF_MAX = int(os.getenv('TASK_RETRY_BACKOFF_MAX', 3600))
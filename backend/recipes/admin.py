@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models import Sum
 
+from . import full_text, shopping_lists
 from .models import (
     Tag, Ingredient, Recipe,
     FavoriteRecipe, ShoppingCart, IngredientRecipe)
@@ -39,11 +41,30 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeListAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorites_count')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     list_filter = ('author', 'name', 'tags')
     search_fields = ('name', 'author__username')
+    readonly_fields = ('favorites_count', 'in_carts_count')
     inlines = (IngredientInline,)
 
-    @admin.display(description='Favorites Count')
-    def favorites_count(self, obj):
-        return obj.favoriterecipe.all().count()
+    @staticmethod
+    def get_ingredient_amounts(recipe):
+        return dict(
+            recipe.ingredientrecipe
+            .values_list('ingredient')
+            .annotate(amount=Sum('amount'))
+            .order_by()
+        )
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        before = self.get_ingredient_amounts(recipe) if change else {}
+        super().save_related(request, form, formsets, change)
+        after = self.get_ingredient_amounts(recipe)
+
+        shopping_lists.apply_ingredient_changes(recipe.pk, {
+            ingredient_id: after.get(ingredient_id, 0)
+            - before.get(ingredient_id, 0)
+            for ingredient_id in before.keys() | after.keys()
+        })
+        full_text.update_search_vectors((recipe.pk,))
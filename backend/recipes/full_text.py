@@ -0,0 +1,60 @@
+"""
+Stored full-text search vectors of recipes.
+
+``Recipe.search_vector`` is a weighted ``tsvector`` in the Russian
+configuration: the recipe name weighs most (A), then the names of its
+ingredients (B), then the description (C). The vector depends on rows of
+several tables, so it is recomputed explicitly whenever a recipe, its
+ingredients or an ingredient name change, and searched through a GIN
+index.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import IngredientRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+
+
+def build_search_vector(ingredient_recipe_model=IngredientRecipe):
+    """Expression computing the vector of the recipe in the outer query."""
+    ingredient_names = Subquery(
+        ingredient_recipe_model.objects
+        .filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(ingredient_names, Value('')),
+            weight='B',
+            config=SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """Recompute the vectors of the given recipes, or of all of them."""
+    queryset = Recipe.objects.all()
+    if recipe_ids is not None:
+        queryset = queryset.filter(pk__in=recipe_ids)
+    return queryset.update(search_vector=build_search_vector())
+
+
+def search(queryset, value):
+    """Recipes matching a web-search style query, best matches first."""
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return (
+        queryset
+        .filter(search_vector=query)
+        .annotate(search_rank=SearchRank(F('search_vector'), query))
+        .order_by('-search_rank', '-pub_date', '-id')
+    )
@@ -0,0 +1,60 @@
+"""
+Generation counters for cached data derived from the database.
+
+A counter is bumped whenever the underlying tables change; anything built
+from them (in-process indexes, cached responses, ETags) stores the
+generation it was built for and is rebuilt once the counter moves on.
+
+The counters are ``Generation`` rows, so every process - web workers, the
+task worker, management commands - sees a bump, and they survive
+restarts. A bump moves a counter to at least the current time in
+nanoseconds, so no value is handed out twice, even after the rows are
+lost. Bumps are applied when the surrounding transaction commits: a
+reader never sees the new generation together with the old data.
+"""
+from time import time_ns
+
+from django.db import connection, transaction
+
+from recipes.models import Generation
+
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+TAGS = 'tags'
+USERS = 'users'
+
+GENERATIONS_TABLE = Generation._meta.db_table
+
+
+def get_user_generation(user_id):
+    """Name of the counter of what a single user sees (favorites...)."""
+    return f'user:{user_id}'
+
+
+def get_generations(names):
+    """Current generations of several counters in one query."""
+    names = list(names)
+    stored = dict(
+        Generation.objects
+        .filter(name__in=names)
+        .values_list('name', 'value')
+    )
+    return {name: stored.get(name, 0) for name in names}
+
+
+def get_generation(name):
+    return get_generations((name,))[name]
+
+
+def write_generation(name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {GENERATIONS_TABLE} (name, value) VALUES (%s, %s) '
+            f'ON CONFLICT (name) DO UPDATE SET value = '
+            f'GREATEST({GENERATIONS_TABLE}.value + 1, EXCLUDED.value)',
+            (name, time_ns())
+        )
+
+
+def bump_generation(name):
+    transaction.on_commit(lambda: write_generation(name))
@@ -0,0 +1,270 @@
+"""
+Resized variants of recipe images.
+
+The uploaded original is stored as is during the request, which queues
+a ``process_recipe_image`` task. A worker then renders ``VARIANT_WIDTHS`` in
+every format of ``VARIANT_FORMATS`` and records their storage names in
+``Recipe.image_variants``:
+
+    {"source": "recipes/images/3f/3fa9....png",
+     "card": {"webp": "recipes/variants/...", "jpeg": "..."}, ...}
+
+Until then, and whenever ``source`` no longer matches the recipe image,
+the original is served in place of every variant.
+
+Variants are named after their source blob, which may be shared by
+several recipes (see ``recipes.storage``), and are deleted together with
+it by ``collect_image()`` once no recipe refers to the blob.
+"""
+from datetime import timedelta
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.generations import RECIPES, bump_generation
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+from tasks.queue import task
+
+VARIANT_WIDTHS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+# format: (Pillow format, file extension, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True,
+                             'progressive': True}),
+}
+VARIANTS_DIRECTORY = 'recipes/variants'
+
+
+def get_variant_names(variants, image_name):
+    """The variants of ``image_name``, or ``None`` if they are not ready."""
+    if not image_name or variants.get('source') != image_name:
+        return None
+    return {size: variants[size] for size in VARIANT_WIDTHS}
+
+
+def get_variant_urls(recipe):
+    """URLs of every variant, the original image standing in until ready."""
+    if not recipe.image:
+        return None
+    names = get_variant_names(recipe.image_variants, recipe.image.name)
+    if names is None:
+        url = recipe.image.url
+        return {
+            size: {image_format: url for image_format in VARIANT_FORMATS}
+            for size in VARIANT_WIDTHS
+        }
+    return {
+        size: {
+            image_format: default_storage.url(name)
+            for image_format, name in formats.items()
+        }
+        for size, formats in names.items()
+    }
+
+
+def get_image_url(recipe, size='full', image_format='jpeg'):
+    urls = get_variant_urls(recipe)
+    if urls is None:
+        return None
+    return urls[size][image_format]
+
+
+def resize(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def flatten(image):
+    """RGB copy of the image, transparent areas painted white."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def get_variant_name(image_name, size, extension):
+    """Storage name of a variant, derived from the name of its source."""
+    source = PurePosixPath(image_name)
+    return (
+        f'{VARIANTS_DIRECTORY}/{source.stem}_{source.suffix[1:]}'
+        f'_{size}.{extension}'
+    )
+
+
+def get_variant_names_of(image_name):
+    for size in VARIANT_WIDTHS:
+        for _, extension, _ in VARIANT_FORMATS.values():
+            yield get_variant_name(image_name, size, extension)
+
+
+def open_image(image_name):
+    with recipe_image_storage.open(image_name) as file:
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    return image
+
+
+def render_variant(image, pillow_format, options):
+    if pillow_format == 'JPEG':
+        image = flatten(image)
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    content = BytesIO()
+    image.save(content, pillow_format, **options)
+    return ContentFile(content.getvalue())
+
+
+def render_variants(image_name):
+    """
+    Save the missing variants of a stored image; returns their names.
+
+    Variant names follow from the content-addressed source name, so a
+    photo uploaded again reuses the variants rendered the first time.
+    """
+    original = None
+    variants = {'source': image_name}
+    for size, width in VARIANT_WIDTHS.items():
+        resized = None
+        variants[size] = {}
+        for image_format, (pillow_format, extension, options) in (
+            VARIANT_FORMATS.items()
+        ):
+            name = get_variant_name(image_name, size, extension)
+            if not default_storage.exists(name):
+                if original is None:
+                    original = open_image(image_name)
+                if resized is None:
+                    resized = resize(original, width)
+                name = default_storage.save(
+                    name, render_variant(resized, pillow_format, options)
+                )
+            variants[size][image_format] = name
+    return variants
+
+
+def delete_variant_files(image_name, variants=None):
+    names = set(get_variant_names_of(image_name))
+    if variants and variants.get('source') == image_name:
+        for size in VARIANT_WIDTHS:
+            names.update(variants.get(size, {}).values())
+    for name in names:
+        default_storage.delete(name)
+
+
+def is_recent(storage, name):
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    grace = timedelta(seconds=settings.IMAGE_COLLECTION_GRACE)
+    return timezone.now() - modified < grace
+
+
+@task
+def collect_image(image_name, variants=None):
+    """
+    Delete an image blob and its variants once no recipe refers to it.
+
+    Blobs written or uploaded again within ``IMAGE_COLLECTION_GRACE``
+    seconds are kept: an upload racing with the collection may be about
+    to refer to them. ``collect_unreferenced_images()`` sweeps them later.
+    """
+    if (
+        not image_name
+        or Recipe.objects.filter(image=image_name).exists()
+        or is_recent(recipe_image_storage, image_name)
+    ):
+        return False
+    recipe_image_storage.delete(image_name)
+    delete_variant_files(image_name, variants)
+    return True
+
+
+def walk_files(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk_files(storage, f'{directory}/{name}')
+
+
+def collect_unreferenced_images(dry_run=False):
+    """
+    Delete stored images and variants that no recipe refers to.
+
+    Catches what ``collect_image()`` left behind: blobs spared by the
+    grace period, failed collections and files written before images
+    were content-addressed. Returns the deleted names.
+    """
+    referenced = set()
+    for image_name, variants in Recipe.objects.values_list(
+        'image', 'image_variants'
+    ):
+        referenced.add(image_name)
+        referenced.update(get_variant_names_of(image_name))
+        for size in VARIANT_WIDTHS:
+            referenced.update(variants.get(size, {}).values())
+
+    deleted = []
+    for storage, directory in (
+        (recipe_image_storage,
+         Recipe._meta.get_field('image').upload_to.rstrip('/')),
+        (default_storage, VARIANTS_DIRECTORY),
+    ):
+        if not storage.exists(directory):
+            continue
+        for name in walk_files(storage, directory):
+            if name in referenced or is_recent(storage, name):
+                continue
+            if not dry_run:
+                storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+@task
+def process_recipe_image(recipe_id):
+    """
+    Render the variants of a recipe image and attach them to every
+    recipe using that image which lacks them.
+    """
+    recipe = (
+        Recipe.objects
+        .filter(pk=recipe_id)
+        .only('id', 'image', 'image_variants')
+        .first()
+    )
+    if recipe is None or not recipe.image:
+        return None
+    image_name = recipe.image.name
+    if get_variant_names(recipe.image_variants, image_name):
+        return recipe.image_variants
+
+    variants = render_variants(image_name)
+    # The image may have been replaced while the variants were rendered.
+    updated = (
+        Recipe.objects
+        .filter(image=image_name)
+        .exclude(image_variants__contains={'source': image_name})
+        .update(image_variants=variants, updated_at=timezone.now())
+    )
+    if not updated:
+        collect_image(image_name, variants)
+        return None
+    bump_generation(RECIPES)
+    return variants
@@ -0,0 +1,218 @@
+"""
+Streaming readers and batched upserts for catalogue imports.
+
+The readers yield one record at a time from JSON arrays, JSON Lines and
+CSV files, so memory use does not grow with the file. Ingredients are
+written with ``INSERT ... ON CONFLICT`` on ``unique_name_measurement_unit``
+one batch at a time, or copied into a temporary staging table with
+``COPY`` and merged with a single statement; either way importing the
+same file twice changes nothing.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from recipes.models import FIELD_MAX_LENGTH, Ingredient, get_search_key
+
+READ_SIZE = 64 * 1024
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+
+
+class ImportFileError(ValueError):
+    """Raised for input that cannot be parsed at all."""
+
+
+def read_json_array(file):
+    """Yield the items of a top-level JSON array without loading it."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = file.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if buffer[position:position + 1] != '[':
+        raise ImportFileError('Expected a JSON array.')
+    position += 1
+    expect_item = True
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ImportFileError('Unexpected end of the JSON array.')
+        if buffer[position] == ']':
+            return
+        if not expect_item:
+            if buffer[position] != ',':
+                raise ImportFileError(
+                    f'Expected "," in the JSON array, got '
+                    f'{buffer[position]!r}.'
+                )
+            position += 1
+            expect_item = True
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            # The item may continue in the next chunk.
+            if eof:
+                raise ImportFileError(str(error)) from error
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A number may be cut in the middle: decode it again.
+            fill()
+            continue
+        position = end
+        expect_item = False
+        yield item
+
+
+def read_json_lines(file):
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ImportFileError(f'Line {number}: {error}') from error
+
+
+def read_csv(file, fields):
+    """Yield rows as dicts; a header row naming ``fields`` is skipped."""
+    reader = csv.reader(file)
+    for row in reader:
+        if reader.line_num == 1 and tuple(row) == tuple(fields):
+            continue
+        yield dict(zip(fields, row))
+
+
+READERS = {
+    'json': read_json_array,
+    'jsonl': read_json_lines,
+    'csv': lambda file: read_csv(file, INGREDIENT_FIELDS),
+}
+
+
+def get_format(path):
+    extension = str(path).rsplit('.', 1)[-1].lower()
+    return {'ndjson': 'jsonl'}.get(extension, extension)
+
+
+def clean_ingredient(record):
+    """``(name, measurement_unit, search_key)``, or ``None`` if invalid."""
+    if not isinstance(record, dict):
+        return None
+    values = []
+    for field in INGREDIENT_FIELDS:
+        value = record.get(field)
+        if not isinstance(value, str):
+            return None
+        value = ' '.join(value.split())
+        if not value or len(value) > FIELD_MAX_LENGTH:
+            return None
+        values.append(value)
+    return (*values, get_search_key(values[0]))
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def get_conflict_action(update):
+    # Every imported column is part of the conflict target: an update can
+    # only bring the derived search key up to date.
+    if update:
+        return 'DO UPDATE SET search_key = EXCLUDED.search_key'
+    return 'DO NOTHING'
+
+
+def upsert_ingredients(rows, update=False):
+    """Insert a batch of cleaned rows; returns the number of new rows."""
+    rows = list(dict.fromkeys(rows))
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        # xmax is 0 for inserted rows and set for updated ones.
+        returned = execute_values(
+            cursor,
+            f'INSERT INTO {table} (name, measurement_unit, search_key) '
+            f'VALUES %s ON CONFLICT ON CONSTRAINT '
+            f'unique_name_measurement_unit {get_conflict_action(update)} '
+            f'RETURNING xmax = 0',
+            rows,
+            page_size=len(rows) or 1,
+            fetch=True
+        )
+    return sum(inserted for inserted, in returned)
+
+
+class IngredientCopy:
+    """
+    ``COPY`` batches into a staging table, then merge them at once.
+
+    Use as a context manager: the staging table lives in the enclosing
+    transaction and is dropped when it commits.
+    """
+    staging_table = 'ingredient_import'
+
+    def __enter__(self):
+        self.atomic = transaction.atomic()
+        self.atomic.__enter__()
+        self.cursor = connection.cursor()
+        self.cursor.execute(
+            f'CREATE TEMPORARY TABLE {self.staging_table} ('
+            'name text, measurement_unit text, search_key text'
+            ') ON COMMIT DROP'
+        )
+        return self
+
+    def copy(self, rows):
+        content = io.StringIO()
+        csv.writer(content).writerows(rows)
+        content.seek(0)
+        self.cursor.copy_expert(
+            f'COPY {self.staging_table} FROM STDIN WITH (FORMAT csv)',
+            content
+        )
+
+    def merge(self, update=False):
+        """Upsert the staged rows; returns the number of new rows."""
+        table = Ingredient._meta.db_table
+        self.cursor.execute(
+            f'WITH merged AS ('
+            f'INSERT INTO {table} (name, measurement_unit, search_key) '
+            f'SELECT DISTINCT ON (name, measurement_unit) '
+            f'name, measurement_unit, search_key '
+            f'FROM {self.staging_table} '
+            f'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+            f'{get_conflict_action(update)} RETURNING xmax = 0 AS inserted'
+            f') SELECT count(*) FILTER (WHERE inserted) FROM merged'
+        )
+        return self.cursor.fetchone()[0]
+
+    def __exit__(self, *exc_info):
+        self.cursor.close()
+        return self.atomic.__exit__(*exc_info)
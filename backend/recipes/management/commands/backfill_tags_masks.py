@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes import tag_masks
+
+
+class Command(BaseCommand):
+    """
+    Recompute the tag bitmasks of recipes from their tags.
+
+    Recipe.tags_mask is updated whenever the tags of a recipe change
+    through the ORM (the API, the admin, recipe.tags.set()). Rows written
+    with bulk operations or raw SQL bypass that; use this command to
+    backfill the masks afterwards:
+
+    python manage.py backfill_tags_masks
+    python manage.py backfill_tags_masks --recipe 1 --recipe 2
+    """
+    help = 'Recompute the tag bitmasks of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            action='append',
+            dest='recipe_ids',
+            help='Only backfill the mask of this recipe id (repeatable).'
+        )
+
+    def handle(self, *args, **options):
+        updated = tag_masks.update_tags_masks(options['recipe_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully backfilled tag masks of {updated} recipes.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping_lists
+
+
+class Command(BaseCommand):
+    """
+    Verify the aggregated shopping lists against the shopping carts.
+
+    Every ShoppingListItem is compared with the total recomputed from the
+    user's cart. Differences are printed as
+
+    user <id>, ingredient <id>: stored <amount>, expected <amount>
+
+    and the command exits with an error, so it can be used in cron jobs
+    or health checks. Fix reported differences with rebuild_shopping_lists.
+    """
+    help = 'Check the aggregated shopping lists against the carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only check the list of this user id (repeatable).'
+        )
+
+    def handle(self, *args, **options):
+        inconsistencies = shopping_lists.find_inconsistencies(
+            options['user_ids']
+        )
+        for user_id, ingredient_id, stored, expected in inconsistencies:
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'stored {stored}, expected {expected}'
+            )
+
+        if inconsistencies:
+            raise CommandError(
+                f'Found {len(inconsistencies)} inconsistent items.')
+        self.stdout.write(self.style.SUCCESS('Shopping lists are consistent.'))
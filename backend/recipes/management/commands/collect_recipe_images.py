@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+
+
+class Command(BaseCommand):
+    """
+    Delete recipe images and image variants no recipe refers to.
+
+    Image blobs are shared between recipes and deleted once the last
+    recipe using them is deleted or gets another image. Blobs written
+    moments before are spared, and files uploaded before images were
+    content-addressed were never collected; run this command periodically
+    to delete them:
+
+    python manage.py collect_recipe_images
+    python manage.py collect_recipe_images --dry-run
+    """
+    help = 'Delete unreferenced recipe images and variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the unreferenced files without deleting them.'
+        )
+
+    def handle(self, *args, **options):
+        deleted = images.collect_unreferenced_images(options['dry_run'])
+        if options['dry_run']:
+            for name in deleted:
+                self.stdout.write(name)
+            self.stdout.write(self.style.SUCCESS(
+                f'Found {len(deleted)} unreferenced files.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully deleted {len(deleted)} unreferenced files.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes import user_state
+
+
+class Command(BaseCommand):
+    """
+    Compact the log behind the per-user state overlay.
+
+    Every favorite, shopping cart and subscription change is appended to
+    UserStateChange. Only the latest change of each object matters for
+    the deltas served by /api/users/me/state/, so older ones can be
+    deleted without affecting any client:
+
+    python manage.py compact_user_state_changes
+    """
+    help = 'Delete superseded user state changes'
+
+    def handle(self, *args, **options):
+        deleted = user_state.compact_changes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully deleted {deleted} superseded changes.'))
@@ -0,0 +1,77 @@
+import json
+import tarfile
+from contextlib import nullcontext
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import transfer
+
+
+class Command(BaseCommand):
+    """
+    Export all recipes as JSON Lines and their images as a tar archive.
+
+    Each line describes one recipe with its author's email, its tag slugs
+    and its ingredients by name and measurement unit (see
+    recipes.transfer); the archive holds every image once, under the name
+    the lines refer to. Load both with import_recipes:
+
+    python manage.py export_recipes recipes.jsonl
+    python manage.py export_recipes recipes.jsonl --media images.tar
+    python manage.py export_recipes recipes.jsonl --no-media
+    """
+    help = 'Export recipes as JSON Lines and a tar archive of images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON Lines file to write.')
+        parser.add_argument(
+            '--media',
+            help='Image archive to write (default: the path with .tar).'
+        )
+        parser.add_argument(
+            '--no-media',
+            action='store_true',
+            help='Do not archive the images.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Recipes read per query.'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        media = None
+        if not options['no_media']:
+            media = Path(options['media'] or path.with_suffix('.tar'))
+
+        exported = archived = missing = 0
+        archived_images = set()
+        try:
+            with open(path, 'w', encoding='utf-8') as file, (
+                tarfile.open(media, 'w') if media else nullcontext()
+            ) as archive:
+                for record in transfer.iter_recipes(options['batch_size']):
+                    file.write(json.dumps(record, ensure_ascii=False))
+                    file.write('\n')
+                    exported += 1
+                    image = record['image']
+                    if media and image not in archived_images:
+                        archived_images.add(image)
+                        if transfer.add_image(archive, image):
+                            archived += 1
+                        else:
+                            missing += 1
+                            self.stderr.write(f'Missing image: {image}')
+        except OSError as error:
+            raise CommandError(f'Error exporting recipes: {error}')
+
+        message = f'Successfully exported {exported} recipes to {path}'
+        if media:
+            message += f' and {archived} images to {media}'
+        self.stdout.write(self.style.SUCCESS(f'{message}.'))
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'{missing} images were missing from the storage.'))
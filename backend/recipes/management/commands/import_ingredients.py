@@ -0,0 +1,133 @@
+from time import monotonic
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import importing
+from recipes.generations import INGREDIENTS, bump_generation
+
+DEFAULT_PATH = 'recipes/data/ingredients.json'
+# Seconds between progress lines.
+PROGRESS_INTERVAL = 1
+
+
+class Command(BaseCommand):
+    """
+    Import ingredients from a JSON, JSON Lines or CSV file.
+
+    The file is read as a stream and written in batches; ingredients that
+    already exist (same name and measurement unit) are left alone, so the
+    command can be run again with the same or an extended file. It should
+    be called from the command line using the following format:
+
+    python manage.py import_ingredients
+    python manage.py import_ingredients recipes/data/ingredients.csv
+    python manage.py import_ingredients catalogue.jsonl --copy
+
+    The format follows the extension (.json, .jsonl/.ndjson, .csv) unless
+    --format is given. Every ingredient has the following structure:
+    {
+        "name": "Flour",
+        "measurement_unit": "grams"
+    }
+    A JSON file holds an array of such objects, a JSON Lines file one
+    object per line, and a CSV file "name,measurement_unit" rows, with or
+    without that header. Invalid records are skipped and counted.
+
+    --copy streams the rows into a temporary table with COPY and merges
+    them with one statement at the end, which is much faster for
+    catalogues of millions of rows but writes nothing if the import fails.
+    --update refreshes the search key of ingredients that already exist.
+    """
+    help = 'Import ingredients from a JSON, JSON Lines or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=DEFAULT_PATH,
+            help=f'File to import (default: {DEFAULT_PATH}).'
+        )
+        parser.add_argument(
+            '--format',
+            choices=tuple(importing.READERS),
+            help='Input format; guessed from the extension by default.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows written per statement.'
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Load the rows with COPY into a staging table first.'
+        )
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help='Refresh existing ingredients instead of skipping them.'
+        )
+
+    def report(self, processed, started):
+        now = monotonic()
+        if now - self.reported < PROGRESS_INTERVAL:
+            return
+        self.reported = now
+        rate = processed / (now - started)
+        self.stdout.write(
+            f'{processed} rows read, {self.skipped} skipped, '
+            f'{rate:.0f} rows/s'
+        )
+
+    def read_rows(self, records):
+        for record in records:
+            row = importing.clean_ingredient(record)
+            if row is None:
+                self.skipped += 1
+            else:
+                yield row
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or importing.get_format(path)
+        if file_format not in importing.READERS:
+            raise CommandError(
+                f'Unknown format "{file_format}"; use --format.')
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive.')
+
+        self.skipped = 0
+        processed = created = 0
+        started = self.reported = monotonic()
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                rows = self.read_rows(importing.READERS[file_format](file))
+                batches = importing.batches(rows, options['batch_size'])
+                if options['copy']:
+                    with importing.IngredientCopy() as copy:
+                        for batch in batches:
+                            copy.copy(batch)
+                            processed += len(batch)
+                            self.report(processed + self.skipped, started)
+                        self.stdout.write('Merging the staged rows...')
+                        created = copy.merge(options['update'])
+                else:
+                    for batch in batches:
+                        created += importing.upsert_ingredients(
+                            batch, options['update']
+                        )
+                        processed += len(batch)
+                        self.report(processed + self.skipped, started)
+        except (OSError, UnicodeDecodeError,
+                importing.ImportFileError) as error:
+            raise CommandError(f'Error importing ingredients: {error}')
+        finally:
+            if created:
+                bump_generation(INGREDIENTS)
+
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully imported ingredients: {created} new, '
+            f'{processed - created} already present, {self.skipped} '
+            f'skipped, in {elapsed:.1f}s.'))
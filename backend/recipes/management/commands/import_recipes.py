@@ -0,0 +1,99 @@
+import tarfile
+from pathlib import Path
+from time import monotonic
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import importing, transfer
+
+# Seconds between progress lines.
+PROGRESS_INTERVAL = 1
+
+
+class Command(BaseCommand):
+    """
+    Import recipes written by export_recipes.
+
+    The images of the archive are stored first (content-addressed, so
+    images already present are not written again), then the JSON Lines
+    file is streamed and written in batches of bulk inserts. Authors,
+    tags and ingredients must already exist: import users, tags and
+    ingredients (import_ingredients) before the recipes. Records
+    referring to anything missing, and recipes whose author already has
+    a recipe of the same name, are skipped, so an interrupted import can
+    simply be run again:
+
+    python manage.py import_recipes recipes.jsonl
+    python manage.py import_recipes recipes.jsonl --media images.tar
+    python manage.py import_recipes recipes.jsonl --no-media
+
+    Image variants are rendered by the task worker afterwards.
+    """
+    help = 'Import recipes from JSON Lines and a tar archive of images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON Lines file to read.')
+        parser.add_argument(
+            '--media',
+            help='Image archive to read (default: the path with .tar).'
+        )
+        parser.add_argument(
+            '--no-media',
+            action='store_true',
+            help='Use images already in the storage only.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Recipes written per batch.'
+        )
+
+    def report(self, importer):
+        now = monotonic()
+        if now - self.reported < PROGRESS_INTERVAL:
+            return
+        self.reported = now
+        processed = importer.created + sum(importer.skipped.values())
+        self.stdout.write(
+            f'{processed} recipes read, {importer.created} created, '
+            f'{processed / (now - self.started):.0f} recipes/s'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive.')
+
+        self.started = self.reported = monotonic()
+        stored_images = {}
+        importer = None
+        try:
+            if not options['no_media']:
+                media = Path(options['media'] or path.with_suffix('.tar'))
+                stored_images = transfer.extract_images(media)
+                self.stdout.write(
+                    f'Stored {len(stored_images)} images from {media}.'
+                )
+
+            importer = transfer.RecipeImporter(stored_images)
+            with open(path, encoding='utf-8') as file:
+                for batch in importing.batches(
+                    importing.read_json_lines(file), options['batch_size']
+                ):
+                    importer.import_batch(batch)
+                    self.report(importer)
+        except (OSError, UnicodeDecodeError, importing.ImportFileError,
+                tarfile.TarError) as error:
+            raise CommandError(f'Error importing recipes: {error}')
+        finally:
+            if importer is not None:
+                importer.finish()
+
+        elapsed = monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully imported {importer.created} recipes '
+            f'in {elapsed:.1f}s.'))
+        for reason, count in sorted(importer.skipped.items()):
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {count} recipes: {reason}.'))
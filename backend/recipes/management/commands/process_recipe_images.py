@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Render the resized image variants of recipes that lack them.
+
+    Variants are rendered in the background after a recipe image is
+    saved. Recipes created before the variants existed, imported in bulk
+    or whose processing failed keep serving the original image; run this
+    command to render their variants synchronously:
+
+    python manage.py process_recipe_images
+    python manage.py process_recipe_images --recipe 1 --recipe 2
+    """
+    help = 'Render missing recipe image variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            action='append',
+            dest='recipe_ids',
+            help='Only process the image of this recipe id (repeatable).'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.only('id', 'image', 'image_variants')
+        if options['recipe_ids'] is not None:
+            recipes = recipes.filter(pk__in=options['recipe_ids'])
+
+        processed = 0
+        for recipe in recipes.iterator():
+            if images.get_variant_names(
+                recipe.image_variants, recipe.image.name
+            ) is None and images.process_recipe_image(recipe.pk):
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully processed images of {processed} recipes.'))
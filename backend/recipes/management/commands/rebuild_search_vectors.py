@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes import full_text
+
+
+class Command(BaseCommand):
+    """
+    Recompute the full-text search vectors of recipes.
+
+    Recipe.search_vector is updated whenever a recipe is saved through the
+    API or the admin and whenever an ingredient is renamed. Rows written
+    with bulk operations or raw SQL bypass that; use this command to
+    recompute the vectors afterwards:
+
+    python manage.py rebuild_search_vectors
+    python manage.py rebuild_search_vectors --recipe 1 --recipe 2
+    """
+    help = 'Recompute the full-text search vectors of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            action='append',
+            dest='recipe_ids',
+            help='Only rebuild the vector of this recipe id (repeatable).'
+        )
+
+    def handle(self, *args, **options):
+        updated = full_text.update_search_vectors(options['recipe_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt search vectors of {updated} recipes.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes import shopping_lists
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the aggregated shopping lists from the shopping carts.
+
+    The ShoppingListItem table is maintained incrementally whenever a
+    recipe is added to or removed from a cart and whenever the ingredients
+    of a recipe change. Use this command to recompute it from scratch,
+    e.g. after importing data with raw SQL:
+
+    python manage.py rebuild_shopping_lists
+    python manage.py rebuild_shopping_lists --user 1 --user 2
+    """
+    help = 'Rebuild the aggregated shopping lists from the shopping carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Only rebuild the list of this user id (repeatable).'
+        )
+
+    def handle(self, *args, **options):
+        shopping_lists.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            'Successfully rebuilt shopping lists.'))
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def count_related(model, field_name):
+    return Coalesce(Subquery(
+        model.objects
+        .filter(**{field_name: OuterRef('pk')})
+        .order_by()
+        .values(field_name)
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0)
+
+
+class Command(BaseCommand):
+    """
+    Recount the denormalized counters and fix the rows that drifted.
+
+    The counters are kept up to date by signal handlers, but rows written
+    with bulk operations or raw SQL bypass them. This command compares
+    every stored counter with the actual number of related rows and
+    rewrites only the ones that differ:
+
+    Recipe.favorites_count  - FavoriteRecipe rows of the recipe
+    Recipe.in_carts_count   - ShoppingCart rows of the recipe
+    FoodgramUser.recipes_count - recipes written by the user
+
+    Rows are processed in primary key order in batches, each checked and
+    fixed with a single UPDATE, so the command can be run on a live
+    database:
+
+    python manage.py reconcile_counters --batch-size 1000
+    """
+    help = 'Recount favorites, shopping cart and recipe counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of rows checked per query.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        counters = (
+            (Recipe, 'favorites_count',
+             count_related(FavoriteRecipe, 'recipe')),
+            (Recipe, 'in_carts_count',
+             count_related(ShoppingCart, 'recipe')),
+            (get_user_model(), 'recipes_count',
+             count_related(Recipe, 'author')),
+        )
+
+        for model, field_name, actual_count in counters:
+            fixed = self.reconcile(
+                model, field_name, actual_count, batch_size
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field_name}: fixed {fixed} rows.'))
+
+    def reconcile(self, model, field_name, actual_count, batch_size):
+        fixed = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                model.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return fixed
+            last_pk = batch[-1]
+
+            # One statement per batch: the counts are taken and written
+            # under the row locks, so concurrent F() increments by the
+            # signal handlers are not overwritten with stale values.
+            fixed += (
+                model.objects
+                .filter(pk__in=batch)
+                .exclude(**{field_name: actual_count})
+                .update(**{field_name: actual_count})
+            )
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FILL_SHOPPING_LIST_ITEMS = '''
+    INSERT INTO recipes_shoppinglistitem (user_id, ingredient_id, total_amount)
+    SELECT cart.user_id, ir.ingredient_id, SUM(ir.amount)
+    FROM recipes_shoppingcart cart
+    JOIN recipes_ingredientrecipe ir ON ir.recipe_id = cart.recipe_id
+    GROUP BY cart.user_id, ir.ingredient_id
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0013_recipe_recipe_author_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0, verbose_name='Total Amount')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to='recipes.ingredient', verbose_name='Ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_items', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Shopping List Item',
+                'verbose_name_plural': 'Shopping List Items',
+                'ordering': ('user', 'ingredient'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient_for_shoppinglistitem'),
+        ),
+        migrations.RunSQL(FILL_SHOPPING_LIST_ITEMS, migrations.RunSQL.noop),
+    ]
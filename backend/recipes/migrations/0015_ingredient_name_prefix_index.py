@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_auto_20261018_2015'),
+    ]
+
+    operations = [
+        # Serves UPPER(name) LIKE 'X%', the lookup behind istartswith.
+        migrations.RunSQL(
+            'CREATE INDEX recipes_ingredient_name_upper_like '
+            'ON recipes_ingredient (UPPER(name) text_pattern_ops)',
+            'DROP INDEX recipes_ingredient_name_upper_like',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def get_search_key(value):
+    # A frozen copy of recipes.models.get_search_key.
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+def fill_search_keys(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.search_key = get_search_key(ingredient.name)
+    Ingredient.objects.bulk_update(
+        ingredients, ('search_key',), batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_auto_20261018_2015'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200, verbose_name='Search Key'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:22
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# A frozen copy of recipes.full_text.build_search_vector.
+FILL_SEARCH_VECTORS = '''
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector(
+            'russian'::regconfig, COALESCE(recipes_recipe.name, '')
+        ), 'A')
+        || setweight(to_tsvector('russian'::regconfig, COALESCE((
+            SELECT STRING_AGG(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe ingredient_recipe
+            JOIN recipes_ingredient ingredient
+            ON ingredient.id = ingredient_recipe.ingredient_id
+            WHERE ingredient_recipe.recipe_id = recipes_recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(
+            'russian'::regconfig, COALESCE(recipes_recipe.text, '')
+        ), 'C')
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_ingredient_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search Vector'),
+        ),
+        migrations.RunSQL(FILL_SEARCH_VECTORS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_recipe_search_vector'),
+    ]
+
+    operations = [
+        # Serves the EXISTS tag filter: the probe for (tag_id, recipe_id)
+        # is answered from the index alone.
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_id_recipe_id_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipes_recipe_tags_tag_id_recipe_id_idx',
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+# A frozen copy of recipes.tag_masks.build_tags_mask: bit tag_id - 1 for
+# every tag up to 63.
+FILL_TAGS_MASKS = '''
+    UPDATE recipes_recipe SET tags_mask = COALESCE((
+        SELECT BIT_OR(1::bigint << (recipe_tag.tag_id - 1)::integer)
+        FROM recipes_recipe_tags recipe_tag
+        WHERE recipe_tag.recipe_id = recipes_recipe.id
+        AND recipe_tag.tag_id <= 63
+    ), 0)
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_tags_tag_recipe_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_pub_date_id_idx',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Tags Mask'),
+        ),
+        migrations.RunSQL(FILL_TAGS_MASKS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], include=('tags_mask',), name='recipe_pub_date_tags_mask_idx'),
+        ),
+    ]
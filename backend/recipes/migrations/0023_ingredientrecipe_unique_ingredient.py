@@ -0,0 +1,38 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:06
+
+from django.db import migrations, models
+
+# Duplicate rows of an ingredient in a recipe are merged into the oldest
+# one, which keeps their total: shopping lists already counted them all.
+MERGE_DUPLICATES = '''
+    UPDATE recipes_ingredientrecipe
+    SET amount = LEAST(duplicates.total, 32767)
+    FROM (
+        SELECT MIN(id) AS id, SUM(amount) AS total
+        FROM recipes_ingredientrecipe
+        GROUP BY recipe_id, ingredient_id
+        HAVING COUNT(*) > 1
+    ) AS duplicates
+    WHERE recipes_ingredientrecipe.id = duplicates.id;
+
+    DELETE FROM recipes_ingredientrecipe
+    USING recipes_ingredientrecipe AS kept
+    WHERE recipes_ingredientrecipe.recipe_id = kept.recipe_id
+    AND recipes_ingredientrecipe.ingredient_id = kept.ingredient_id
+    AND recipes_ingredientrecipe.id > kept.id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0022_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunSQL(MERGE_DUPLICATES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='ingredientrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient_for_ingredientrecipe'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:20
+
+from django.db import migrations
+
+INDEX_NAME = 'recipes_ingredient_search_key_trgm'
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm ships with the official Postgres images; without it the
+    # substring search falls back to a sequential scan.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+        'USING gin (search_key gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0023_ingredientrecipe_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
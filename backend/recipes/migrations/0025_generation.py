@@ -0,0 +1,24 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0024_ingredient_search_key_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Generation',
+            fields=[
+                ('name', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Name')),
+                ('value', models.BigIntegerField(verbose_name='Value')),
+            ],
+            options={
+                'verbose_name': 'Generation',
+                'verbose_name_plural': 'Generations',
+            },
+        ),
+    ]
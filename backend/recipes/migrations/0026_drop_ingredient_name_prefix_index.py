@@ -0,0 +1,22 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_ingredient_name_prefix_index'),
+        ('recipes', '0025_generation'),
+    ]
+
+    operations = [
+        # Ingredient lookups go through search_key: the UPPER(name) index
+        # of 0015 serves no query. IF EXISTS: databases that ran the
+        # migrations without 0015 never had it.
+        migrations.RunSQL(
+            'DROP INDEX IF EXISTS recipes_ingredient_name_upper_like',
+            'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_like '
+            'ON recipes_ingredient (UPPER(name) text_pattern_ops)',
+        ),
+    ]
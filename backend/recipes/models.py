@@ -1,10 +1,14 @@
 from colorfield.fields import ColorField
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (
     MaxValueValidator, MinValueValidator
 )
 from django.db import models
 
+from recipes.storage import recipe_image_storage
+
 
 FIELD_MAX_LENGTH = 200
 COLOR_FIELD_MAX_LENGTH = 7
@@ -13,6 +17,14 @@ MIN_VALUE_VALIDATOR = 1
 MAX_VALUE_VALIDATOR = 32763
 
 
+def get_search_key(value):
+    """
+    Normalized form of a name for case- and ё-insensitive search:
+    casefolded, with ё replaced by е and whitespace collapsed.
+    """
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
 class Tag(models.Model):
     name = models.CharField(
         'Name',
@@ -45,6 +57,12 @@ class Ingredient(models.Model):
         'Measurement Unit',
         max_length=FIELD_MAX_LENGTH
     )
+    search_key = models.CharField(
+        'Search Key',
+        max_length=FIELD_MAX_LENGTH,
+        db_index=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ('name', 'measurement_unit')
@@ -60,6 +78,10 @@ class Ingredient(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_key = get_search_key(self.name)
+        super().save(*args, **kwargs)
+
 
 class Recipe(models.Model):
     author = models.ForeignKey(
@@ -70,7 +92,11 @@ class Recipe(models.Model):
     )
     name = models.CharField('Name', max_length=FIELD_MAX_LENGTH)
     text = models.TextField('Description')
-    image = models.ImageField('Image', upload_to='recipes/images/')
+    image = models.ImageField(
+        'Image',
+        upload_to='recipes/images/',
+        storage=recipe_image_storage
+    )
     cooking_time = models.PositiveIntegerField(
         'Cooking Time',
         validators=[MinValueValidator(MIN_VALUE_VALIDATOR)]
@@ -79,6 +105,35 @@ class Recipe(models.Model):
         verbose_name='Date of creation.',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Date of the last change.',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Favorites Count',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Shopping Carts Count',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        'Search Vector',
+        null=True,
+        editable=False
+    )
+    tags_mask = models.BigIntegerField(
+        'Tags Mask',
+        default=0,
+        editable=False
+    )
+    image_variants = models.JSONField(
+        'Image Variants',
+        default=dict,
+        editable=False
+    )
     tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
@@ -91,14 +146,46 @@ class Recipe(models.Model):
         verbose_name='Ingredients'
     )
 
+    # Maintained with F() updates, recipes.full_text, recipes.tag_masks and
+    # recipes.images; never written back from a stale instance.
+    MAINTAINED_FIELDS = (
+        'favorites_count', 'in_carts_count', 'search_vector', 'tags_mask',
+        'image_variants'
+    )
+
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                include=('tags_mask',),
+                name='recipe_pub_date_tags_mask_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx'
+            ),
+            models.Index(fields=('image',), name='recipe_image_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientRecipe(models.Model):
     recipe = models.ForeignKey(
@@ -118,6 +205,14 @@ class IngredientRecipe(models.Model):
         ],
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient_for_ingredientrecipe'
+            )
+        ]
+
     def __str__(self):
         return (
             f'Recipe of {self.recipe} needs {self.ingredient}'
@@ -178,3 +273,53 @@ class ShoppingCart(UserRecipeBaseModel):
         return (
             f'{self.recipe} added to shopping cart by {self.user}'
         )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='User',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ingredient'
+    )
+    total_amount = models.IntegerField('Total Amount', default=0)
+
+    class Meta:
+        ordering = ('user', 'ingredient')
+        verbose_name = 'Shopping List Item'
+        verbose_name_plural = 'Shopping List Items'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient_for_shoppinglistitem'
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.user} needs {self.ingredient}'
+            f' in the amount of {self.total_amount}'
+        )
+
+
+class Generation(models.Model):
+    """A version counter of cached data, see ``recipes.generations``."""
+    name = models.CharField(
+        'Name',
+        max_length=FIELD_MAX_LENGTH,
+        primary_key=True
+    )
+    value = models.BigIntegerField('Value')
+
+    class Meta:
+        verbose_name = 'Generation'
+        verbose_name_plural = 'Generations'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
@@ -0,0 +1,95 @@
+"""
+In-process prefix index over the ingredient catalogue.
+
+The catalogue is small and read on every keystroke of the ingredient
+autocomplete, so it is kept in memory as a list sorted by the normalized
+``Ingredient.search_key``: prefix matches are found with a binary search,
+substring matches with a scan. The index is rebuilt lazily when the
+``ingredients`` generation changes, or when the number or the highest id
+of the stored ingredients does; the database is asked for those every
+``INGREDIENT_SEARCH_INDEX_CHECK_INTERVAL`` seconds, which catches writes
+of other processes such as ``import_ingredients``.
+"""
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from recipes.generations import INGREDIENTS, get_generation
+from recipes.models import Ingredient, get_search_key
+
+
+class IngredientPrefixIndex:
+
+    def __init__(self):
+        self.version = None
+        self.checked_at = None
+        self.catalogue = ((), ())
+        self.lock = Lock()
+
+    def build(self):
+        # Sorted in Python: bisect needs code point order, not the
+        # database collation.
+        ingredients = sorted(
+            Ingredient.objects.only(
+                'id', 'name', 'measurement_unit', 'search_key'
+            ),
+            key=lambda ingredient: (
+                ingredient.search_key, ingredient.measurement_unit
+            )
+        )
+        keys = [ingredient.search_key for ingredient in ingredients]
+        return keys, ingredients
+
+    @staticmethod
+    def get_stored_version():
+        stored = Ingredient.objects.aggregate(
+            count=Count('pk'), last_pk=Max('pk')
+        )
+        return stored['count'], stored['last_pk']
+
+    def refresh(self, generation=None):
+        if generation is None:
+            generation = get_generation(INGREDIENTS)
+        now = monotonic()
+        if (
+            self.version is not None
+            and self.version[0] == generation
+            and now - self.checked_at
+            < settings.INGREDIENT_SEARCH_INDEX_CHECK_INTERVAL
+        ):
+            return
+
+        version = (generation, self.get_stored_version())
+        self.checked_at = now
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.catalogue = self.build()
+                self.version = version
+
+    def search(self, value, generation=None):
+        """
+        Ingredients starting with ``value``, then those containing it.
+        ``generation`` spares the read of the ``ingredients`` counter when
+        the caller already has it.
+        """
+        self.refresh(generation)
+        keys, ingredients = self.catalogue
+        value = get_search_key(value)
+
+        start = end = bisect_left(keys, value)
+        while end < len(keys) and keys[end].startswith(value):
+            end += 1
+
+        return ingredients[start:end] + [
+            ingredients[index]
+            for index, key in enumerate(keys)
+            if value in key and not start <= index < end
+        ]
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,158 @@
+"""
+Incremental maintenance of the per-user ``ShoppingListItem`` aggregate.
+
+Every row holds the total amount of one ingredient over all recipes in
+the user's shopping cart. The functions below apply the change caused by
+a single cart entry or recipe edit with one upsert, so reading the list
+never has to re-aggregate ``IngredientRecipe``.
+"""
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from recipes.models import (
+    IngredientRecipe, ShoppingCart, ShoppingListItem
+)
+
+ITEMS_TABLE = ShoppingListItem._meta.db_table
+CART_TABLE = ShoppingCart._meta.db_table
+INGREDIENTS_TABLE = IngredientRecipe._meta.db_table
+
+INSERT_ITEMS = (
+    f'INSERT INTO {ITEMS_TABLE} (user_id, ingredient_id, total_amount) '
+)
+UPSERT = (
+    f'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET total_amount = '
+    f'{ITEMS_TABLE}.total_amount + EXCLUDED.total_amount'
+)
+
+
+def _delete_empty_items(cursor, where, params):
+    cursor.execute(
+        f'DELETE FROM {ITEMS_TABLE} WHERE total_amount <= 0 AND {where}',
+        params
+    )
+
+
+def add_recipe(user_id, recipe_id, sign=1):
+    """Add the ingredients of a recipe to the user's shopping list."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{INSERT_ITEMS}'
+            'SELECT %s, ingredient_id, %s * SUM(amount) '
+            f'FROM {INGREDIENTS_TABLE} WHERE recipe_id = %s '
+            f'GROUP BY ingredient_id {UPSERT}',
+            (user_id, sign, recipe_id)
+        )
+        if sign < 0:
+            _delete_empty_items(cursor, 'user_id = %s', (user_id,))
+
+
+def remove_recipe(user_id, recipe_id):
+    """Subtract the ingredients of a recipe from the user's shopping list."""
+    add_recipe(user_id, recipe_id, sign=-1)
+
+
+def apply_ingredient_changes(recipe_id, deltas):
+    """
+    Propagate changed ingredient amounts of a recipe to every shopping
+    list that contains it. ``deltas`` maps ingredient ids to the change
+    of their amount; removed ingredients carry their negated amount.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return
+
+    values = ', '.join(['(%s, %s)'] * len(deltas))
+    params = [value for item in deltas.items() for value in item]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{INSERT_ITEMS}'
+            'SELECT cart.user_id, delta.ingredient_id, delta.amount '
+            f'FROM {CART_TABLE} cart '
+            f'CROSS JOIN (VALUES {values}) AS delta (ingredient_id, amount) '
+            f'WHERE cart.recipe_id = %s {UPSERT}',
+            (*params, recipe_id)
+        )
+        _delete_empty_items(
+            cursor,
+            f'user_id IN (SELECT user_id FROM {CART_TABLE} '
+            f'WHERE recipe_id = %s)',
+            (recipe_id,)
+        )
+
+
+def expected_totals(user_ids=None):
+    """Totals computed from scratch out of the carts, for verification."""
+    if user_ids is None:
+        cart_filter = {'recipe__shoppingcart__isnull': False}
+    else:
+        cart_filter = {'recipe__shoppingcart__user__in': user_ids}
+    return {
+        (row['recipe__shoppingcart__user'], row['ingredient']): row['total']
+        for row in (
+            IngredientRecipe.objects
+            .filter(**cart_filter)
+            .values('recipe__shoppingcart__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+    }
+
+
+def stored_totals(user_ids=None):
+    queryset = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user__in=user_ids)
+    return {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount in (
+            queryset.values_list('user', 'ingredient', 'total_amount')
+        )
+    }
+
+
+def find_inconsistencies(user_ids=None):
+    """
+    Compare the aggregate with the carts.
+
+    Returns ``(user_id, ingredient_id, stored, expected)`` tuples for
+    every item that differs; missing items are reported as ``None``.
+    """
+    expected = expected_totals(user_ids)
+    stored = stored_totals(user_ids)
+    return sorted(
+        (user_id, ingredient_id,
+         stored.get((user_id, ingredient_id)),
+         expected.get((user_id, ingredient_id)))
+        for user_id, ingredient_id in expected.keys() | stored.keys()
+        if stored.get((user_id, ingredient_id))
+        != expected.get((user_id, ingredient_id))
+    )
+
+
+def rebuild(user_ids=None):
+    """Recompute the aggregate of the given users, or of everybody."""
+    where = ''
+    params = ()
+    if user_ids is not None:
+        where = 'WHERE cart.user_id = ANY(%s)'
+        params = (list(user_ids),)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if user_ids is None:
+            cursor.execute(f'DELETE FROM {ITEMS_TABLE}')
+        else:
+            cursor.execute(
+                f'DELETE FROM {ITEMS_TABLE} WHERE user_id = ANY(%s)', params
+            )
+        cursor.execute(
+            f'{INSERT_ITEMS}'
+            'SELECT cart.user_id, ir.ingredient_id, SUM(ir.amount) '
+            f'FROM {CART_TABLE} cart '
+            f'JOIN {INGREDIENTS_TABLE} ir ON ir.recipe_id = cart.recipe_id '
+            f'{where} GROUP BY cart.user_id, ir.ingredient_id',
+            params
+        )
@@ -0,0 +1,246 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes import (
+    full_text, images, shopping_lists, tag_masks, user_state
+)
+from recipes.generations import (
+    INGREDIENTS, RECIPES, TAGS, USERS, bump_generation, get_user_generation
+)
+from recipes.models import (
+    FavoriteRecipe, Ingredient, IngredientRecipe, Recipe, ShoppingCart, Tag
+)
+
+from users.models import Subscription, UserStateChange
+
+User = get_user_model()
+
+
+def touch_recipes(recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+def get_state_change(instance):
+    if isinstance(instance, Subscription):
+        return (
+            instance.subscriber_id, UserStateChange.SUBSCRIPTION,
+            instance.subscribed_to_id
+        )
+    if isinstance(instance, FavoriteRecipe):
+        return instance.user_id, UserStateChange.FAVORITE, instance.recipe_id
+    return instance.user_id, UserStateChange.SHOPPING_CART, instance.recipe_id
+
+
+def update_counter(model, pk, field_name, delta):
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field_name}__gte': -delta})
+    queryset.update(**{field_name: F(field_name) + delta})
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def decrement_favorites_count(sender, instance, **kwargs):
+    update_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increment_in_carts_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_in_carts_count(sender, instance, **kwargs):
+    update_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        shopping_lists.add_recipe(instance.user_id, instance.recipe_id)
+
+
+# pre_delete runs before a cascade removes the recipe's ingredients.
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    shopping_lists.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        update_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    update_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    if instance.image and images.get_variant_names(
+        instance.image_variants, instance.image.name
+    ) is None:
+        images.process_recipe_image.enqueue(instance.pk)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_stored_image(sender, instance, update_fields, **kwargs):
+    if instance._state.adding or (
+        update_fields is not None and 'image' not in update_fields
+    ):
+        return
+    instance._stored_image = (
+        Recipe.objects
+        .filter(pk=instance.pk)
+        .values_list('image', 'image_variants')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def collect_replaced_image(sender, instance, **kwargs):
+    stored = instance.__dict__.pop('_stored_image', None)
+    if stored is not None and stored[0] != instance.image.name:
+        images.collect_image.enqueue(*stored)
+
+
+@receiver(post_delete, sender=Recipe)
+def collect_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        images.collect_image.enqueue(
+            instance.image.name, instance.image_variants
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_generation(sender, **kwargs):
+    bump_generation(INGREDIENTS)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipe_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        full_text.update_search_vectors(
+            IngredientRecipe.objects
+            .filter(ingredient=instance)
+            .values('recipe')
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    # tag.recipes.clear() reports no pk_set: remember the recipes first.
+    if action == 'pre_clear' and reverse:
+        instance._cleared_recipe_ids = list(
+            instance.recipes.values_list('pk', flat=True)
+        )
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        recipe_ids = (instance.pk,)
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_cleared_recipe_ids', ())
+    else:
+        recipe_ids = pk_set
+    if recipe_ids:
+        tag_masks.update_tags_masks(recipe_ids)
+        touch_recipes(recipe_ids)
+
+
+# IngredientRecipe has no delete receivers, so its querysets delete in a
+# single query: the API and the admin save the recipe around removed
+# ingredients, and a deleted ingredient touches its recipes below.
+@receiver(post_save, sender=IngredientRecipe)
+def touch_recipe(sender, instance, **kwargs):
+    touch_recipes((instance.recipe_id,))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, **kwargs):
+    touch_recipes(
+        IngredientRecipe.objects
+        .filter(ingredient=instance)
+        .values('recipe')
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(pre_delete, sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_generation(sender, **kwargs):
+    bump_generation(RECIPES)
+
+
+# Recipes embed their author; logins only touch last_login.
+@receiver(post_save, sender=User)
+def bump_users_generation(sender, update_fields, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_generation(USERS)
+        bump_generation(RECIPES)
+
+
+@receiver(post_delete, sender=User)
+def bump_users_generation_on_delete(sender, **kwargs):
+    bump_generation(USERS)
+
+
+# Favorites, cart entries and subscriptions only change what their user
+# sees.
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def bump_user_generation(sender, instance, **kwargs):
+    bump_generation(get_user_generation(instance.user_id))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_subscriber_generation(sender, instance, **kwargs):
+    bump_generation(get_user_generation(instance.subscriber_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_generation(sender, **kwargs):
+    bump_generation(TAGS)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def record_state_addition(sender, instance, created, **kwargs):
+    if created:
+        user_state.record_change(*get_state_change(instance), added=True)
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def record_state_removal(sender, instance, **kwargs):
+    user_state.record_change(*get_state_change(instance), added=False)
+
+
+# Deleting a user cascades to their favorites, whose removals are logged
+# after the user's log was already deleted; drop them before the deferred
+# foreign key check at commit.
+@receiver(post_delete, sender=User)
+def delete_state_changes(sender, instance, **kwargs):
+    UserStateChange.objects.filter(user_id=instance.pk).delete()
@@ -0,0 +1,44 @@
+"""
+Content-addressed storage of recipe images.
+
+Files are named after the SHA-256 of their content,
+``recipes/images/<2 hex>/<sha256>.<ext>``, so uploading a photo that is
+already stored writes nothing and returns the existing name. A blob is
+shared by every recipe whose ``image`` names it; ``recipes.images``
+deletes it once no recipe refers to it anymore.
+"""
+import os
+import posixpath
+from hashlib import sha256
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    @staticmethod
+    def get_content_name(name, content):
+        digest = sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        digest = digest.hexdigest()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Refresh the blob so a concurrent collection spares it.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -0,0 +1,54 @@
+"""
+Tag bitmasks of recipes.
+
+``Recipe.tags_mask`` has bit ``tag.pk - 1`` set for every tag of the
+recipe, so "any of these tags" is a single ``tags_mask & mask <> 0``
+predicate on the recipe row instead of a probe into the M2M table. Only
+tags with ``pk <= MAX_TAG_ID`` fit into the signed bigint; filters on
+other tags fall back to the M2M table.
+"""
+from django.contrib.postgres.aggregates import BitOr
+from django.db.models import (
+    BigIntegerField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery,
+    Value
+)
+from django.db.models.functions import Cast, Coalesce
+
+from recipes.models import Recipe
+
+MAX_TAG_ID = 63
+
+
+def get_tags_mask(tag_ids):
+    """Mask of the given tag ids, or ``None`` if one of them has no bit."""
+    mask = 0
+    for tag_id in tag_ids:
+        if not 0 < tag_id <= MAX_TAG_ID:
+            return None
+        mask |= 1 << (tag_id - 1)
+    return mask
+
+
+def build_tags_mask(recipe_tag_model=Recipe.tags.through):
+    """Expression computing the mask of the recipe in the outer query."""
+    return Coalesce(Subquery(
+        recipe_tag_model.objects
+        .filter(recipe=OuterRef('pk'), tag_id__lte=MAX_TAG_ID)
+        .order_by()
+        .values('recipe')
+        .annotate(mask=BitOr(ExpressionWrapper(
+            Cast(Value(1), BigIntegerField()).bitleftshift(
+                Cast(F('tag_id') - 1, IntegerField())
+            ),
+            output_field=BigIntegerField()
+        )))
+        .values('mask')
+    ), 0)
+
+
+def update_tags_masks(recipe_ids=None):
+    """Recompute the masks of the given recipes, or of all of them."""
+    queryset = Recipe.objects.all()
+    if recipe_ids is not None:
+        queryset = queryset.filter(pk__in=recipe_ids)
+    return queryset.update(tags_mask=build_tags_mask())
@@ -0,0 +1,320 @@
+"""
+Export and import of recipes as JSON Lines plus a tar archive of images.
+
+Every line of the export is one recipe, referring to its author by
+email, to its tags by slug and to its ingredients by name and
+measurement unit, so the file can be loaded into another database:
+
+    {"author": "cook@example.com", "name": "Borscht", "text": "...",
+     "cooking_time": 90, "pub_date": "2024-02-07T10:00:00+00:00",
+     "image": "recipes/images/3f/3fa9....jpg", "tags": ["lunch"],
+     "ingredients": [{"name": "beet", "measurement_unit": "g",
+                      "amount": 300}]}
+
+The import resolves these references through in-memory maps and writes
+every batch with a few bulk statements; the bookkeeping signals would
+otherwise do per recipe (search vectors, tag masks, recipe counters,
+image variants) is done once per batch.
+"""
+import tarfile
+from collections import Counter
+from pathlib import PurePosixPath
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes import full_text, images, tag_masks
+from recipes.generations import RECIPES, USERS, bump_generation
+from recipes.models import (
+    FIELD_MAX_LENGTH, MAX_VALUE_VALIDATOR, MIN_VALUE_VALIDATOR, Ingredient,
+    IngredientRecipe, Recipe, Tag
+)
+from recipes.storage import recipe_image_storage
+from tasks.queue import enqueue_many
+
+User = get_user_model()
+
+# Reasons an imported record is skipped.
+INVALID = 'invalid'
+DUPLICATE = 'already present'
+UNKNOWN_AUTHOR = 'unknown author'
+UNKNOWN_TAG = 'unknown tag'
+UNKNOWN_INGREDIENT = 'unknown ingredient'
+MISSING_IMAGE = 'missing image'
+
+
+def iter_recipes(batch_size):
+    """Yield the export records of all recipes, in primary key order."""
+    last_pk = 0
+    while True:
+        recipes = list(
+            Recipe.objects
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .select_related('author')
+            .only(
+                'id', 'name', 'text', 'cooking_time', 'pub_date', 'image',
+                'author__email'
+            )[:batch_size]
+        )
+        if not recipes:
+            return
+        last_pk = recipes[-1].pk
+
+        ingredients = {recipe.pk: [] for recipe in recipes}
+        for recipe_id, name, measurement_unit, amount in (
+            IngredientRecipe.objects
+            .filter(recipe__in=recipes)
+            .order_by('pk')
+            .values_list(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            )
+        ):
+            ingredients[recipe_id].append({
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            })
+        tags = {recipe.pk: [] for recipe in recipes}
+        for recipe_id, slug in (
+            Recipe.tags.through.objects
+            .filter(recipe__in=recipes)
+            .order_by('tag__slug')
+            .values_list('recipe_id', 'tag__slug')
+        ):
+            tags[recipe_id].append(slug)
+
+        for recipe in recipes:
+            yield {
+                'author': recipe.author.email,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'pub_date': recipe.pub_date.isoformat(),
+                'image': recipe.image.name,
+                'tags': tags[recipe.pk],
+                'ingredients': ingredients[recipe.pk],
+            }
+
+
+def add_image(archive, image_name):
+    """Add a stored image to the archive; returns False if it is missing."""
+    if not recipe_image_storage.exists(image_name):
+        return False
+    info = tarfile.TarInfo(image_name)
+    info.size = recipe_image_storage.size(image_name)
+    info.mtime = int(
+        recipe_image_storage.get_modified_time(image_name).timestamp()
+    )
+    with recipe_image_storage.open(image_name) as file:
+        archive.addfile(info, file)
+    return True
+
+
+def extract_images(path):
+    """
+    Store the images of an archive; maps member names to storage names.
+
+    Images are stored through the content-addressed storage: those that
+    are already present are not written again.
+    """
+    upload_to = Recipe._meta.get_field('image').upload_to
+    stored = {}
+    with tarfile.open(path) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            # Only the extension of the member name is kept.
+            name = upload_to + PurePosixPath(member.name).name
+            with archive.extractfile(member) as file:
+                stored[member.name] = recipe_image_storage.save(
+                    name, File(file, name)
+                )
+    return stored
+
+
+def is_positive_int(value, maximum=None):
+    return (
+        isinstance(value, int) and not isinstance(value, bool)
+        and value >= MIN_VALUE_VALIDATOR
+        and (maximum is None or value <= maximum)
+    )
+
+
+def is_name(value):
+    return isinstance(value, str) and 0 < len(value) <= FIELD_MAX_LENGTH
+
+
+class RecipeImporter:
+    """
+    Writes export records in batches.
+
+    Authors, tags and ingredients are looked up in maps loaded once;
+    records referring to anything missing, or repeating a recipe name of
+    the same author already in the database, are skipped and counted in
+    ``skipped`` by reason.
+    """
+
+    def __init__(self, stored_images=None):
+        # Archive member or stored name: storage name, None if missing.
+        self.stored_images = dict(stored_images or {})
+        self.authors = dict(User.objects.values_list('email', 'pk'))
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        }
+        self.existing = set(Recipe.objects.values_list('author_id', 'name'))
+        self.skipped = Counter()
+        self.created = 0
+
+    @staticmethod
+    def is_stored_image(name):
+        # Names come from the import file: only look inside the image
+        # directory, never at paths such as "../../etc/passwd".
+        upload_to = Recipe._meta.get_field('image').upload_to
+        path = PurePosixPath(name)
+        if (
+            not name.startswith(upload_to)
+            or path.is_absolute() or '..' in path.parts
+        ):
+            return False
+        try:
+            return recipe_image_storage.exists(name)
+        except SuspiciousFileOperation:
+            return False
+
+    def get_image(self, name):
+        if not isinstance(name, str):
+            return None
+        if name not in self.stored_images:
+            self.stored_images[name] = (
+                name if self.is_stored_image(name) else None
+            )
+        return self.stored_images[name]
+
+    def resolve(self, record):
+        """``(recipe, tag ids, ingredient amounts)`` or a skip reason."""
+        if not isinstance(record, dict):
+            return INVALID
+        author_id = self.authors.get(record.get('author'))
+        if author_id is None:
+            return UNKNOWN_AUTHOR
+        name, text = record.get('name'), record.get('text')
+        cooking_time = record.get('cooking_time')
+        pub_date = record.get('pub_date')
+        if pub_date is not None:
+            pub_date = parse_datetime(str(pub_date))
+            if pub_date is None:
+                return INVALID
+        tags, ingredients = record.get('tags'), record.get('ingredients')
+        if not (
+            is_name(name) and isinstance(text, str)
+            and is_positive_int(cooking_time)
+            and isinstance(tags, list) and isinstance(ingredients, list)
+            and tags and ingredients
+        ):
+            return INVALID
+        if (author_id, name) in self.existing:
+            return DUPLICATE
+
+        tag_ids = []
+        for slug in tags:
+            tag_id = self.tags.get(slug)
+            if tag_id is None:
+                return UNKNOWN_TAG
+            tag_ids.append(tag_id)
+        amounts = {}
+        for ingredient in ingredients:
+            if not isinstance(ingredient, dict):
+                return INVALID
+            amount = ingredient.get('amount')
+            if not is_positive_int(amount, MAX_VALUE_VALIDATOR):
+                return INVALID
+            ingredient_id = self.ingredients.get((
+                ingredient.get('name'), ingredient.get('measurement_unit')
+            ))
+            if ingredient_id is None:
+                return UNKNOWN_INGREDIENT
+            if ingredient_id in amounts:
+                return INVALID
+            amounts[ingredient_id] = amount
+
+        image = self.get_image(record.get('image'))
+        if image is None:
+            return MISSING_IMAGE
+        recipe = Recipe(
+            author_id=author_id, name=name, text=text,
+            cooking_time=cooking_time, image=image,
+            pub_date=pub_date or timezone.now()
+        )
+        return recipe, set(tag_ids), amounts
+
+    def import_batch(self, records):
+        resolved = []
+        for record in records:
+            result = self.resolve(record)
+            if isinstance(result, str):
+                self.skipped[result] += 1
+                continue
+            recipe = result[0]
+            self.existing.add((recipe.author_id, recipe.name))
+            resolved.append(result)
+        if not resolved:
+            return 0
+
+        recipes = [recipe for recipe, _, _ in resolved]
+        with transaction.atomic():
+            pub_dates = [recipe.pub_date for recipe in recipes]
+            Recipe.objects.bulk_create(recipes)
+            # bulk_create applies auto_now_add: restore the exported dates.
+            for recipe, pub_date in zip(recipes, pub_dates):
+                recipe.pub_date = pub_date
+            Recipe.objects.bulk_update(recipes, ('pub_date',))
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for recipe, _, amounts in resolved
+                for ingredient_id, amount in amounts.items()
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                for recipe, tag_ids, _ in resolved
+                for tag_id in tag_ids
+            )
+
+            recipe_ids = [recipe.pk for recipe in recipes]
+            tag_masks.update_tags_masks(recipe_ids)
+            full_text.update_search_vectors(recipe_ids)
+            User.objects.filter(
+                pk__in={recipe.author_id for recipe in recipes}
+            ).update(recipes_count=Coalesce(Subquery(
+                Recipe.objects
+                .filter(author=OuterRef('pk'))
+                .order_by()
+                .values('author')
+                .annotate(count=Count('pk'))
+                .values('count')
+            ), 0))
+            # A task renders the variants for every recipe sharing the
+            # image: queue one per distinct image.
+            enqueue_many(images.process_recipe_image, {
+                recipe.image.name: (recipe.pk,) for recipe in recipes
+            }.values())
+        self.created += len(recipes)
+        return len(recipes)
+
+    def finish(self):
+        if self.created:
+            bump_generation(RECIPES)
+            bump_generation(USERS)
@@ -0,0 +1,72 @@
+"""
+Measurement unit conversion for the shopping list.
+
+The catalogue in ``recipes/data/ingredients.json`` measures the same
+product in different but compatible units (``г`` and ``кг``, ``мл``,
+``л`` and spoons). Units of one dimension are converted to its canonical
+unit before amounts are summed; units without a known conversion
+(``шт.``, ``по вкусу``, ``пучок``...) form a dimension of their own.
+"""
+from itertools import groupby
+
+MASS = 'mass'
+VOLUME = 'volume'
+
+# unit: (dimension, size in the canonical unit of the dimension)
+UNITS = {
+    'г': (MASS, 1),
+    'кг': (MASS, 1000),
+    'мл': (VOLUME, 1),
+    'л': (VOLUME, 1000),
+    'стакан': (VOLUME, 250),
+    'ст. л.': (VOLUME, 15),
+    'ч. л.': (VOLUME, 5),
+    'капля': (VOLUME, 0.05),
+}
+CANONICAL_UNITS = {
+    MASS: 'г',
+    VOLUME: 'мл',
+}
+
+
+def get_dimension(unit):
+    return UNITS.get(unit, (unit, 1))
+
+
+def format_amount(amount):
+    if amount == int(amount):
+        return int(amount)
+    return round(amount, 2)
+
+
+def merge_compatible_units(rows):
+    """
+    Merge shopping list rows of one product measured in compatible units.
+
+    ``rows`` are dicts with ``ingredient__name``,
+    ``ingredient__measurement_unit`` and ``amount`` keys ordered by name;
+    they are consumed lazily and yielded in the same shape. A product
+    measured in a single unit is passed through unchanged; amounts in
+    several units of one dimension are summed in its canonical unit.
+    """
+    for name, group in groupby(rows, key=lambda row: row['ingredient__name']):
+        dimensions = {}
+        for row in group:
+            unit = row['ingredient__measurement_unit']
+            amounts = dimensions.setdefault(get_dimension(unit)[0], {})
+            amounts[unit] = amounts.get(unit, 0) + row['amount']
+
+        for dimension, amounts in dimensions.items():
+            if len(amounts) == 1:
+                (unit, amount), = amounts.items()
+            else:
+                unit = CANONICAL_UNITS[dimension]
+                amount = sum(
+                    source_amount * get_dimension(source_unit)[1]
+                    for source_unit, source_amount in amounts.items()
+                )
+            yield {
+                'ingredient__name': name,
+                'ingredient__measurement_unit': unit,
+                'amount': format_amount(amount),
+            }
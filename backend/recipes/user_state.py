@@ -0,0 +1,116 @@
+"""
+Per-user state overlay: favorites, shopping cart and subscriptions.
+
+Recipe payloads without per-user flags are the same for every user and
+can be cached publicly; clients combine them with this overlay. Every
+change is appended to ``UserStateChange`` with the next version of its
+user: a client sends the version it has and receives only what was
+added or removed since.
+
+The versions come from ``FoodgramUser.state_version``, incremented in
+the transaction that records the change. Its row lock makes the writers
+of a user commit in version order, so once a version is visible every
+lower one is too; ids, allocated before commit, give no such guarantee.
+"""
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import FoodgramUser, Subscription, UserStateChange
+
+STATE_KEYS = {
+    UserStateChange.FAVORITE: 'favorites',
+    UserStateChange.SHOPPING_CART: 'shopping_cart',
+    UserStateChange.SUBSCRIPTION: 'subscriptions',
+}
+
+
+def record_change(user_id, kind, object_id, added):
+    with transaction.atomic():
+        users = FoodgramUser.objects.filter(pk=user_id)
+        users.update(state_version=F('state_version') + 1)
+        version = users.values_list('state_version', flat=True).first()
+        if version is None:
+            # The user is being deleted along with their log.
+            return
+        UserStateChange.objects.create(
+            user_id=user_id, kind=kind, object_id=object_id, added=added,
+            version=version
+        )
+
+
+def get_version(user):
+    return FoodgramUser.objects.filter(pk=user.pk).values_list(
+        'state_version', flat=True
+    ).first() or 0
+
+
+def get_full_state(user):
+    return {
+        'favorites': FavoriteRecipe.objects.filter(user=user)
+        .values_list('recipe', flat=True),
+        'shopping_cart': ShoppingCart.objects.filter(user=user)
+        .values_list('recipe', flat=True),
+        'subscriptions': Subscription.objects.filter(subscriber=user)
+        .values_list('subscribed_to', flat=True),
+    }
+
+
+def get_state(user, since=None):
+    """
+    The user's state as ``added``/``removed`` id lists per kind.
+
+    Without ``since`` every current id is reported as added and ``full``
+    is true: the client replaces its state. With ``since`` only the net
+    effect of the changes after that version is reported.
+    """
+    # Read the version first: a change racing with the reads below is
+    # sent again with the next delta, and re-applying it is harmless.
+    version = get_version(user)
+    if since is None:
+        return {
+            'version': version,
+            'full': True,
+            **{
+                key: {'added': sorted(ids), 'removed': []}
+                for key, ids in get_full_state(user).items()
+            },
+        }
+
+    latest = {}
+    for kind, object_id, added in (
+        UserStateChange.objects
+        .filter(user=user, version__gt=since, version__lte=version)
+        .order_by('version')
+        .values_list('kind', 'object_id', 'added')
+    ):
+        latest[kind, object_id] = added
+
+    state = {
+        key: {'added': [], 'removed': []} for key in STATE_KEYS.values()
+    }
+    for (kind, object_id), added in sorted(latest.items()):
+        state[STATE_KEYS[kind]]['added' if added else 'removed'].append(
+            object_id
+        )
+    return {'version': version, 'full': False, **state}
+
+
+def compact_changes():
+    """
+    Delete changes superseded by a later change of the same object.
+
+    The net effect of any range of versions stays the same, so deltas
+    remain correct while the log is bounded by the number of distinct
+    objects each user has touched.
+    """
+    superseded = UserStateChange.objects.filter(
+        user=OuterRef('user'),
+        kind=OuterRef('kind'),
+        object_id=OuterRef('object_id'),
+        version__gt=OuterRef('version'),
+    )
+    deleted, _ = UserStateChange.objects.filter(
+        Exists(superseded)
+    ).delete()
+    return deleted
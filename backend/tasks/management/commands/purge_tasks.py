@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    """
+    Delete finished tasks older than --days.
+
+    Done and failed tasks are kept for task_stats and for inspecting
+    failures in the admin; run this command periodically to bound the
+    table:
+
+    python manage.py purge_tasks
+    python manage.py purge_tasks --days 1 --failed
+    """
+    help = 'Delete old finished tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=7,
+            help='Age of the finished tasks to delete.'
+        )
+        parser.add_argument(
+            '--failed',
+            action='store_true',
+            help='Also delete failed tasks.'
+        )
+
+    def handle(self, *args, **options):
+        statuses = [Task.DONE]
+        if options['failed']:
+            statuses.append(Task.FAILED)
+        deleted, _ = Task.objects.filter(
+            status__in=statuses,
+            finished_at__lt=timezone.now() - timedelta(days=options['days'])
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully deleted {deleted} tasks.'))
@@ -0,0 +1,72 @@
+import signal
+from threading import Event, Thread
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tasks import queue
+
+
+class Command(BaseCommand):
+    """
+    Run queued background tasks.
+
+    Starts --concurrency threads (TASK_WORKER_CONCURRENCY by default), each
+    claiming and running one due task at a time. Several workers, on one
+    or many hosts, can share the queue. SIGINT and SIGTERM let the running
+    tasks finish before exiting:
+
+    python manage.py run_worker
+    python manage.py run_worker --concurrency 4
+    python manage.py run_worker --burst
+    """
+    help = 'Run queued background tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.TASK_WORKER_CONCURRENCY,
+            help='Number of tasks run at the same time.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.TASK_POLL_INTERVAL,
+            help='Seconds to wait for new tasks when the queue is empty.'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty.'
+        )
+
+    @staticmethod
+    def run_thread(stop, poll_interval, burst):
+        try:
+            queue.work(stop, poll_interval, burst)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        stop = Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+
+        threads = [
+            Thread(
+                target=self.run_thread,
+                args=(stop, options['poll_interval'], options['burst']),
+                name=f'task-worker-{number}'
+            )
+            for number in range(max(1, options['concurrency']))
+        ]
+        self.stdout.write(
+            f'Running tasks in {len(threads)} threads.'
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
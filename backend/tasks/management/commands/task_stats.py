@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import (
+    Avg, Count, DurationField, ExpressionWrapper, F, Max, Q
+)
+from django.utils import timezone
+
+from tasks.models import Task
+
+
+def as_duration(expression):
+    return ExpressionWrapper(expression, output_field=DurationField())
+
+
+class Command(BaseCommand):
+    """
+    Report the task queue per task name.
+
+    Counts the queued, running and failed tasks and, for the tasks
+    finished in the last --hours, how long they waited in the queue
+    (start - due time of the attempt) and how long they ran:
+
+    python manage.py task_stats
+    python manage.py task_stats --hours 1
+    """
+    help = 'Report task queue counts and latencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=24,
+            help='Window of finished tasks to report latencies of.'
+        )
+
+    @staticmethod
+    def format_duration(value):
+        if value is None:
+            return '-'
+        return f'{value.total_seconds():.3f}s'
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours'])
+        finished = Q(status=Task.DONE, finished_at__gte=since)
+        latency = as_duration(F('started_at') - F('run_at'))
+        rows = (
+            Task.objects
+            .order_by('name')
+            .values('name')
+            .annotate(
+                queued=Count('id', filter=Q(status=Task.QUEUED)),
+                running=Count('id', filter=Q(status=Task.RUNNING)),
+                failed=Count('id', filter=Q(status=Task.FAILED)),
+                done=Count('id', filter=finished),
+                average_latency=Avg(latency, filter=finished),
+                max_latency=Max(latency, filter=finished),
+                average_duration=Avg(
+                    as_duration(F('finished_at') - F('started_at')),
+                    filter=finished
+                ),
+            )
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['name']}: queued {row['queued']}, "
+                f"running {row['running']}, failed {row['failed']}, "
+                f"done {row['done']}; latency avg "
+                f"{self.format_duration(row['average_latency'])}, max "
+                f"{self.format_duration(row['max_latency'])}; duration avg "
+                f"{self.format_duration(row['average_duration'])}"
+            )
@@ -0,0 +1,69 @@
+from django.db import models
+from django.utils import timezone
+
+TASK_NAME_MAX_LENGTH = 200
+
+
+class Task(models.Model):
+    """
+    A call of a registered task function, queued in the database.
+
+    Workers claim due tasks with ``SELECT ... FOR UPDATE SKIP LOCKED`` and
+    hold a lease on them until ``locked_until``; a task whose worker died
+    is claimed again once its lease expires.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField('Name', max_length=TASK_NAME_MAX_LENGTH)
+    args = models.JSONField('Arguments', default=list)
+    status = models.CharField(
+        'Status',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=QUEUED
+    )
+    attempts = models.PositiveIntegerField('Attempts', default=0)
+    max_attempts = models.PositiveIntegerField('Max Attempts')
+    created_at = models.DateTimeField('Created At', auto_now_add=True)
+    run_at = models.DateTimeField('Run At', default=timezone.now)
+    started_at = models.DateTimeField('Started At', null=True, blank=True)
+    finished_at = models.DateTimeField('Finished At', null=True, blank=True)
+    locked_until = models.DateTimeField(
+        'Locked Until',
+        null=True,
+        blank=True
+    )
+    last_error = models.TextField('Last Error', blank=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Task'
+        verbose_name_plural = 'Tasks'
+        indexes = [
+            models.Index(
+                fields=('run_at', 'id'),
+                condition=models.Q(status='queued'),
+                name='task_queued_run_at_idx'
+            ),
+            models.Index(
+                fields=('locked_until',),
+                condition=models.Q(status='running'),
+                name='task_running_locked_until_idx'
+            ),
+            models.Index(
+                fields=('status', 'finished_at'),
+                name='task_status_finished_at_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name}{tuple(self.args)} [{self.status}]'
@@ -0,0 +1,170 @@
+"""
+Background task queue stored in Postgres.
+
+A module-level function becomes a task with the ``task`` decorator and
+is queued with ``func.enqueue(*args)``; the arguments must be JSON
+serializable. The row is inserted in the caller's transaction, so a task
+only becomes visible to workers once that transaction commits, and is
+dropped with it on rollback.
+
+``manage.py run_worker`` claims due tasks with ``SELECT ... FOR UPDATE
+SKIP LOCKED``, so any number of worker threads and processes share the
+queue without handing a task out twice. A failed task is retried with
+exponential backoff until ``max_attempts`` is reached; a task whose
+worker died is claimed again once its lease expires. Tasks may thus run
+more than once and must be idempotent.
+
+With ``TASK_QUEUE_EAGER`` tasks run in the process, on commit, instead.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+
+def task(func=None, *, max_attempts=None):
+    """Register a module-level function as a task."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts or settings.TASK_MAX_ATTEMPTS
+        func.enqueue = lambda *args, **kwargs: enqueue(func, *args, **kwargs)
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(func, *args, delay=None):
+    """Queue a call of the task ``func``, after ``delay`` seconds if set."""
+    if settings.TASK_QUEUE_EAGER:
+        transaction.on_commit(lambda: func(*args))
+        return None
+
+    run_at = timezone.now()
+    if delay:
+        run_at += timedelta(seconds=delay)
+    return Task.objects.create(
+        name=func.task_name,
+        args=list(args),
+        max_attempts=func.max_attempts,
+        run_at=run_at
+    )
+
+
+def enqueue_many(func, calls):
+    """Queue a call of ``func`` per argument tuple, in one statement."""
+    calls = [list(args) for args in calls]
+    if settings.TASK_QUEUE_EAGER:
+        transaction.on_commit(lambda: [func(*args) for args in calls])
+        return []
+
+    return Task.objects.bulk_create(
+        Task(
+            name=func.task_name,
+            args=args,
+            max_attempts=func.max_attempts
+        )
+        for args in calls
+    )
+
+
+def get_task_function(name):
+    func = import_string(name)
+    if getattr(func, 'task_name', None) != name:
+        raise ImportError(f'{name} is not a registered task.')
+    return func
+
+
+def get_backoff(attempts):
+    """Seconds before retrying after ``attempts`` failed attempts."""
+    backoff = min(
+        settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.TASK_RETRY_BACKOFF_MAX
+    )
+    return backoff * random.uniform(0.5, 1)
+
+
+def claim_task():
+    """Lease the next due task to the calling worker, if there is one."""
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = (
+            Task.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Task.QUEUED, run_at__lte=now)
+                | Q(status=Task.RUNNING, locked_until__lte=now)
+            )
+            .order_by('run_at', 'id')
+            .first()
+        )
+        if claimed is None:
+            return None
+        claimed.status = Task.RUNNING
+        claimed.attempts += 1
+        claimed.started_at = now
+        claimed.locked_until = now + timedelta(seconds=settings.TASK_LEASE)
+        claimed.save(update_fields=(
+            'status', 'attempts', 'started_at', 'locked_until'
+        ))
+    return claimed
+
+
+def finish_task(claimed, **fields):
+    # A worker that outlived its lease must not overwrite the new attempt.
+    Task.objects.filter(
+        pk=claimed.pk, status=Task.RUNNING, attempts=claimed.attempts
+    ).update(finished_at=timezone.now(), locked_until=None, **fields)
+
+
+def run_task(claimed):
+    """Run a claimed task and record its outcome."""
+    try:
+        if claimed.attempts > claimed.max_attempts:
+            raise RuntimeError('The lease expired on the last attempt.')
+        get_task_function(claimed.name)(*claimed.args)
+    except Exception:
+        logger.exception('Task %s failed (attempt %s of %s).',
+                         claimed, claimed.attempts, claimed.max_attempts)
+        error = traceback.format_exc()
+        if claimed.attempts < claimed.max_attempts:
+            finish_task(
+                claimed, status=Task.QUEUED, last_error=error,
+                run_at=timezone.now() + timedelta(
+                    seconds=get_backoff(claimed.attempts)
+                )
+            )
+        else:
+            finish_task(claimed, status=Task.FAILED, last_error=error)
+        return False
+    finish_task(claimed, status=Task.DONE)
+    return True
+
+
+def work(stop, poll_interval, burst=False):
+    """
+    Claim and run tasks until ``stop`` is set.
+
+    Waits ``poll_interval`` seconds whenever the queue is empty, or
+    returns then if ``burst`` is true.
+    """
+    while not stop.is_set():
+        close_old_connections()
+        claimed = claim_task()
+        if claimed is not None:
+            run_task(claimed)
+        elif burst:
+            return
+        else:
+            stop.wait(poll_interval)
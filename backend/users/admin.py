@@ -8,7 +8,7 @@ from users.models import FoodgramUser, Subscription
 @admin.register(FoodgramUser)
 class FoodgramUserAdmin(UserAdmin):
     list_display = (
-        'id', 'username', 'email', 'first_name', 'last_name'
+        'id', 'username', 'email', 'first_name', 'last_name', 'recipes_count'
     )
     list_filter = ('email', 'username')
     search_fields = ('id', 'username')
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_recipes_count(apps, schema_editor):
+    FoodgramUser = apps.get_model('users', 'FoodgramUser')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FoodgramUser.objects.update(recipes_count=Coalesce(Subquery(
+        Recipe.objects
+        .filter(author=OuterRef('pk'))
+        .order_by()
+        .values('author')
+        .annotate(count=Count('pk'))
+        .values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_alter_foodgramuser_username'),
+        ('recipes', '0012_auto_20261018_2013'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Recipes Count'),
+        ),
+        migrations.RunPython(fill_recipes_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_foodgramuser_recipes_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStateChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('favorite', 'Favorite Recipe'), ('shopping_cart', 'Shopping Cart'), ('subscription', 'Subscription')], max_length=16, verbose_name='Kind')),
+                ('object_id', models.BigIntegerField(verbose_name='Object ID')),
+                ('added', models.BooleanField(verbose_name='Added')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_changes', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'User State Change',
+                'verbose_name_plural': 'User State Changes',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userstatechange',
+            index=models.Index(fields=['user', 'id'], name='userstatechange_user_id_idx'),
+        ),
+    ]
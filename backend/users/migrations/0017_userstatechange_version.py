@@ -0,0 +1,46 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:50
+
+from django.db import migrations, models
+
+# Frozen SQL: the ids were the version tokens so far, so clients keep
+# their versions and every user continues from their highest id.
+FILL_VERSIONS = '''
+    UPDATE users_userstatechange SET version = id;
+    UPDATE users_foodgramuser AS u SET state_version = c.version
+    FROM (
+        SELECT user_id, MAX(version) AS version
+        FROM users_userstatechange
+        GROUP BY user_id
+    ) AS c
+    WHERE c.user_id = u.id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_userstatechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodgramuser',
+            name='state_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='The version of the latest UserStateChange of the user', verbose_name='State Version'),
+        ),
+        migrations.AddField(
+            model_name='userstatechange',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Version'),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(FILL_VERSIONS, migrations.RunSQL.noop),
+        migrations.RemoveIndex(
+            model_name='userstatechange',
+            name='userstatechange_user_id_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='userstatechange',
+            constraint=models.UniqueConstraint(fields=('user', 'version'), name='unique_user_version_for_userstatechange'),
+        ),
+    ]
@@ -23,9 +23,22 @@ class FoodgramUser(AbstractUser):
         'Password',
         max_length=USER_FIELD_MAX_LENGTH
     )
+    recipes_count = models.PositiveIntegerField(
+        'Recipes Count',
+        default=0,
+        editable=False
+    )
+    state_version = models.PositiveBigIntegerField(
+        'State Version',
+        default=0,
+        editable=False,
+        help_text='The version of the latest UserStateChange of the user'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'password', 'first_name', 'last_name')
+    # Maintained with F() updates; never written back from a stale instance.
+    MAINTAINED_FIELDS = ('recipes_count', 'state_version')
 
     class Meta:
         ordering = ('username',)
@@ -35,6 +48,15 @@ class FoodgramUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Subscription(models.Model):
     subscriber = models.ForeignKey(
@@ -66,3 +88,46 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.subscriber} subscribes to {self.subscribed_to}'
+
+
+class UserStateChange(models.Model):
+    """
+    Append-only log of what users add to or remove from their favorites,
+    shopping carts and subscriptions. ``version`` numbers the changes of
+    each user in commit order and serves as the version token of the state
+    overlay endpoint.
+    """
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KIND_CHOICES = (
+        (FAVORITE, 'Favorite Recipe'),
+        (SHOPPING_CART, 'Shopping Cart'),
+        (SUBSCRIPTION, 'Subscription'),
+    )
+
+    user = models.ForeignKey(
+        FoodgramUser,
+        on_delete=models.CASCADE,
+        related_name='state_changes',
+        verbose_name='User'
+    )
+    kind = models.CharField('Kind', max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField('Object ID')
+    added = models.BooleanField('Added')
+    version = models.PositiveBigIntegerField('Version')
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'User State Change'
+        verbose_name_plural = 'User State Changes'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'version'),
+                name='unique_user_version_for_userstatechange'
+            ),
+        ]
+
+    def __str__(self):
+        action = 'adds' if self.added else 'removes'
+        return f'{self.user} {action} {self.kind} {self.object_id}'